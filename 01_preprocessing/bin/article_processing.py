@@ -0,0 +1,183 @@
+import os
+import time
+from collections import Counter, namedtuple
+from multiprocessing import Pool
+
+from entity_dictionary import VERBATIM
+from entity_matcher import EntityMatcher
+from organism_registry import OrganismMatcher
+from pair_pruning import NO_PRUNING, candidate_pairs
+from sentence_splitter import iter_sentences
+
+# Result of one article, entities are the canonical names of both lists found in the searched lines,
+# counters the lines rejected by each stage of the prefilter and the pairs dropped by each
+# pruning rule, and stats the instrumentation
+# (seconds, bytes, entity_hits, pairs_per_sentence) summed by RunSummary
+ArticleResult = namedtuple("ArticleResult", ["file", "rows", "n_sentences", "entities", "counters", "stats"])
+
+# Matcher and pruning rules of each worker process, set once by init_worker
+worker_matcher = None
+worker_pruning = NO_PRUNING
+
+
+def build_matcher(tfs, regulated, rules=VERBATIM, organisms=None):
+    """
+    :param tfs: list, transcription factor names
+    :param regulated: list, regulated gene names
+    :param rules: DictionaryRules, aliases and normalization rules of the entity dictionary
+    :param organisms: list of Organism, lists of several organisms searched together instead of tfs / regulated
+    :return: EntityMatcher, or OrganismMatcher with organisms
+    """
+    if organisms is not None:
+        return OrganismMatcher(organisms, rules)
+    return EntityMatcher(tfs, regulated, rules)
+
+
+def init_worker(tfs, regulated, pruning=NO_PRUNING, rules=VERBATIM, organisms=None):
+    """
+    Compile the entity lists once in every worker of the pool.
+
+    :param tfs: list, transcription factor names
+    :param regulated: list, regulated gene names
+    :param pruning: PairPruning, rules applied to the candidate pairs
+    :param rules: DictionaryRules, aliases and normalization rules of the entity dictionary
+    :param organisms: list of Organism, lists of several organisms searched together instead of tfs / regulated
+    """
+    global worker_matcher, worker_pruning
+    worker_matcher = build_matcher(tfs, regulated, rules, organisms)
+    worker_pruning = pruning
+
+
+def article_pmid(file):
+    """
+    :param file: str, name of the article file, "<PMID>.txt" for the articles of the PMID list
+    :return: str, PMID of the article, empty if the name is not a PMID
+    """
+    stem = os.path.splitext(file)[0]
+    return stem if stem.isdigit() else ""
+
+
+def process_article(path, matcher, verbose=False, pruning=NO_PRUNING, split_sentences=False):
+    """
+    Get the candidate TF - regulated pairs of every line of an article.
+
+    With an OrganismMatcher the line is scanned once and the hits of every
+    organism give its own rows, counters and stats.
+
+    :param path: str, path of the preprocessed article (one sentence per line)
+    :param matcher: EntityMatcher, compiled entity lists, or OrganismMatcher with the lists of several organisms
+    :param verbose: bool, print every entity found and every combination
+    :param pruning: PairPruning, rules applied to the candidate pairs
+    :param split_sentences: bool, split every line of a raw article into sentences before matching
+    :return: ArticleResult, rows are (sentence, entity_spans, regulator, regulated, file, line, pmid),
+        line is the number of the sentence in the article; dict organism -> ArticleResult with an OrganismMatcher
+    """
+    start = time.perf_counter()
+    file = os.path.basename(path)
+    pmid = article_pmid(file)
+    # Un solo organismo (None) con un EntityMatcher
+    organisms = matcher.organisms if isinstance(matcher, OrganismMatcher) else [None]
+    n_sentences = 0
+    # Rows, entities, counters, hits of every entity ("tf:ArcA") and sentences by number of candidate pairs
+    # of every organism
+    parts = {organism: ([], {"tfs": set(), "regulated": set()}, Counter(), Counter(), Counter())
+             for organism in organisms}
+    with open(path, mode="r") as ifile:
+        # Artículos sin separar: cada línea (párrafo) se divide en oraciones al leerla
+        sentences = iter_sentences(ifile) if split_sentences else (line.rstrip("\n") for line in ifile)
+        for line in sentences:
+            n_sentences += 1
+            # Las líneas sin TF o sin regulado no pasan a la búsqueda ni a los pares
+            rejected = matcher.prefilter(line)
+            if rejected is not None:
+                for organism in organisms:
+                    parts[organism][2]["rejected_" + rejected] += 1
+                continue
+            # Cada hit (alias, mayúsculas, etc.) se cuenta con el nombre canónico de su lista
+            hits = matcher.find_entities(line)
+            if organisms == [None]:
+                hits = {None: hits}
+            for organism, (hits_tf, hits_regulated) in hits.items():
+                rows, entities, counters, entity_hits, pairs_per_sentence = parts[organism]
+                counters["searched"] += 1
+                spans_tf = [span for span, _ in hits_tf]
+                spans_regulated = [span for span, _ in hits_regulated]
+                entities["tfs"].update(name for _, name in hits_tf)
+                entities["regulated"].update(name for _, name in hits_regulated)
+                entity_hits.update("tf:" + name for _, name in hits_tf)
+                entity_hits.update("regulated:" + name for _, name in hits_regulated)
+                if verbose:
+                    for span, name in hits_tf:
+                        print("TF {} encontrado en {}".format(name, span))
+                        print("Entidad: {}".format(line[span[0]:span[1]]))
+                # Los regulados solo se consideran si sí se encontraron TFs
+                if spans_tf and spans_regulated:
+                    entity_lists = [spans_tf, spans_regulated]
+                    if verbose:
+                        for span, name in hits_regulated:
+                            print("regulated {} encontrado en {}".format(name, span))
+                            print("Entidad: {}".format(line[span[0]:span[1]]))
+                        print("entity_lists: {}".format(entity_lists))
+                    # Pares lejanos, autorregulados o sobre el tope por oración no llegan a LUKE
+                    pairs = candidate_pairs(line, spans_tf, spans_regulated, pruning, counters, matcher.margin,
+                                            matcher.delimiters)
+                    for elem in pairs:
+                        if verbose:
+                            print("Combinations: {}".format(elem))
+                        rows.append((line, elem, line[elem[0][0]:elem[0][1]], line[elem[1][0]:elem[1][1]], file, n_sentences, pmid))
+                    counters["pairs"] += len(pairs)
+                    pairs_per_sentence[len(pairs)] += 1
+                if verbose:
+                    print("**********")
+    seconds = time.perf_counter() - start
+    results = {}
+    for organism, (rows, entities, counters, entity_hits, pairs_per_sentence) in parts.items():
+        stats = {"seconds": seconds, "bytes": os.path.getsize(path),
+                 "entity_hits": entity_hits, "pairs_per_sentence": pairs_per_sentence}
+        results[organism] = ArticleResult(file, rows, n_sentences,
+                                          {kind: sorted(names) for kind, names in entities.items()}, counters, stats)
+    return results if organisms != [None] else results[None]
+
+
+def process_article_in_worker(args):
+    """Pool entry point, uses the matcher compiled by init_worker."""
+    path, verbose, split_sentences = args
+    return process_article(path, worker_matcher, verbose, worker_pruning, split_sentences)
+
+
+def process_articles(paths, tfs, regulated, n_workers=1, verbose=False, chunksize=4, pruning=NO_PRUNING,
+                     rules=VERBATIM, split_sentences=False, organisms=None):
+    """
+    Process articles serially or sharded across a process pool.
+
+    Results are yielded in the order of ``paths`` in both modes, so the merged
+    output is the same as the one of a serial run.
+
+    :param paths: list, paths of the articles
+    :param tfs: list, transcription factor names
+    :param regulated: list, regulated gene names
+    :param n_workers: int, number of processes, 1 runs in the current process
+    :param verbose: bool, print every entity found and every combination
+    :param chunksize: int, articles sent to a worker at a time
+    :param pruning: PairPruning, rules applied to the candidate pairs
+    :param rules: DictionaryRules, aliases and normalization rules of the entity dictionary
+    :param split_sentences: bool, split every line of raw articles into sentences, in the workers
+    :param organisms: list of Organism, lists of several organisms searched in the same pass instead of
+        tfs / regulated
+    :return: generator of ArticleResult, of dicts organism -> ArticleResult with organisms
+    """
+    if n_workers <= 1:
+        matcher = build_matcher(tfs, regulated, rules, organisms)
+        for path in paths:
+            if verbose:
+                print("Archivo: {}".format(os.path.basename(path)))
+            yield process_article(path, matcher, verbose, pruning, split_sentences)
+        return
+    with Pool(n_workers, initializer=init_worker, initargs=(list(tfs), list(regulated), pruning, rules, organisms)) as pool:
+        tasks = [(path, verbose, split_sentences) for path in paths]
+        # imap keeps the order of the input paths
+        for path, result in zip(paths, pool.imap(process_article_in_worker, tasks, chunksize=chunksize)):
+            if verbose:
+                print("Archivo: {}".format(os.path.basename(path)))
+            yield result
+
@@ -0,0 +1,206 @@
+"""
+Tokenization of a whole batch in the collate function of the DataLoader.
+
+RelationExtractionDataset.__getitem__ of the modelling scripts called the
+tokenizer on one sentence with return_tensors="pt" and squeezed every
+tensor, one tokenizer call and several tensor allocations per sample and
+epoch. With BatchCollator the dataset only returns the sentence (and the
+entity_spans for LUKE) and the label id of a row, and the collate_fn of
+the DataLoader tokenizes the sentences of the batch in one call:
+
+    collate = BatchCollator(tokenizer)
+    DataLoader(dataset, batch_size=32, shuffle=True, collate_fn=collate)
+
+With padding=True every batch is padded to its longest sentence instead of
+the 512 tokens of "max_length", and LengthBucketSampler groups sentences
+of similar length in the same batch so little padding is left:
+
+    sampler = LengthBucketSampler(train_df.sentence.str.len(), 32, shuffle=True)
+    DataLoader(dataset, batch_sampler=sampler, collate_fn=collate)
+
+BatchCollator.padding_report() gives the share of pad tokens of the
+batches it built, and the share "max_length" padding would have given.
+The LUKE pairs of a batch are encoded with LukePairEncoder, which
+tokenizes the sentence of several pairs once (luke_pair_encoding.py).
+"""
+import math
+
+import numpy as np
+
+# Keys of an item that are not passed on as lists
+ITEM_KEYS = ("entity_spans", "label", "encoding")
+
+
+def to_tensors(arrays, return_tensors="pt"):
+    """
+    :param arrays: dict, name -> numpy array
+    :param return_tensors: str, "pt" for torch tensors, "np" to keep numpy arrays
+    :return: dict, name -> tensor
+    """
+    if return_tensors == "np":
+        return arrays
+    # Only the modelling scripts need torch
+    import torch
+    return {name: torch.from_numpy(np.ascontiguousarray(array)) for name, array in arrays.items()}
+
+
+class BatchCollator:
+    """
+    collate_fn that tokenizes the items of a batch together.
+
+    Items are dicts with:
+
+    - sentence: str, and entity_spans: [(start_tf, end_tf), (start_regulated, end_regulated)] for LUKE.
+    - encoding: dict of arrays of the row already tokenized (ModelArrays), instead of the sentence.
+    - label: int, label id, optional.
+    - the sentence and any other key (regulator, regulated, ...) are also returned as lists.
+
+    The batch has the model inputs (input_ids, attention_mask, ... as the
+    tokenizer names them) and label as tensors, under encoding_key if it is
+    given. With dynamic padding the rows of ModelArrays are cut to the
+    longest row of the batch too. The padding counters are kept in the
+    process that calls the collator (the main process with num_workers=0).
+    """
+
+    def __init__(self, tokenizer, padding="max_length", max_length=None, return_tensors="pt", encoding_key=None):
+        """
+        :param tokenizer: tokenizer of the model (AutoTokenizer, LukeTokenizer)
+        :param padding: str or bool, padding of the tokenizer call: True pads every batch to its longest
+            sentence, "max_length" to max_length as the per-item calls did
+        :param max_length: int, truncation length, None for the model maximum
+        :param return_tensors: str, "pt" for torch tensors, "np" for numpy arrays
+        :param encoding_key: str, key of the batch with the model inputs (e.g. "tokenized_data"), None puts them
+            at the top level
+        """
+        self.tokenizer = tokenizer
+        self.padding = padding
+        self.max_length = max_length
+        self.return_tensors = return_tensors
+        self.encoding_key = encoding_key
+        # Same encoding as the LukeTokenizer call, the sentences shared by several pairs are tokenized once
+        self.pair_encoder = None
+        if getattr(tokenizer, "task", None) == "entity_pair_classification":
+            from luke_pair_encoding import LukePairEncoder
+            self.pair_encoder = LukePairEncoder(tokenizer)
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Start the padding counters again (e.g. for every trial of a sweep)."""
+        # Rows, tokens that are not padding, token positions of the batches and of "max_length" padding
+        self.stats = {"rows": 0, "tokens": 0, "positions": 0, "max_length_positions": 0}
+
+    def padding_report(self):
+        """
+        :return: dict, rows, tokens and positions of the batches built, padding_ratio (pad positions / positions)
+            and max_length_padding_ratio (the same with every row padded to max_length)
+        """
+        report = dict(self.stats)
+        report["padding_ratio"] = 1 - self.stats["tokens"] / self.stats["positions"] if self.stats["positions"] else 0.0
+        report["max_length_padding_ratio"] = (1 - self.stats["tokens"] / self.stats["max_length_positions"]
+                                              if self.stats["max_length_positions"] else 0.0)
+        return report
+
+    def encode(self, items):
+        """
+        :param items: list of dict, items of the batch
+        :return: dict, name -> numpy array of the model inputs of the batch
+        """
+        if "encoding" in items[0]:
+            encoding = {name: np.stack([item["encoding"][name] for item in items]) for name in items[0]["encoding"]}
+            self.stats["max_length_positions"] += encoding["attention_mask"].size
+            if self.padding != "max_length":
+                # Rows were written with "max_length" padding, the token axis is cut to the longest row
+                length = int(encoding["attention_mask"].sum(axis=1).max())
+                encoding = {name: array if name.startswith("entity_") else array[:, :length]
+                            for name, array in encoding.items()}
+            return encoding
+        self.stats["max_length_positions"] += len(items) * (self.max_length or self.tokenizer.model_max_length)
+        kwargs = {}
+        tokenizer = self.tokenizer
+        if "entity_spans" in items[0]:
+            kwargs["entity_spans"] = [[tuple(int(x) for x in span) for span in item["entity_spans"]] for item in items]
+            tokenizer = self.pair_encoder or tokenizer
+        encoding = tokenizer([item["sentence"] for item in items], padding=self.padding, truncation=True,
+                             max_length=self.max_length, **kwargs)
+        # The padded lists are converted at once, faster than return_tensors="np" of the tokenizer
+        return {name: np.array(encoding[name], dtype=np.int64) for name in encoding.keys()}
+
+    def __call__(self, items):
+        """
+        :param items: list of dict, items of the batch as RelationExtractionDataset returns them
+        :return: dict, model inputs, label and metadata of the batch
+        """
+        encoding = self.encode(items)
+        self.stats["rows"] += len(items)
+        self.stats["tokens"] += int(encoding["attention_mask"].sum())
+        self.stats["positions"] += encoding["attention_mask"].size
+        if "label" in items[0]:
+            encoding["label"] = np.array([item["label"] for item in items], dtype=np.int64)
+        encoding = to_tensors(encoding, self.return_tensors)
+        batch = {self.encoding_key: encoding} if self.encoding_key is not None else encoding
+        for key in items[0]:
+            if key not in ITEM_KEYS:
+                batch[key] = [item[key] for item in items]
+        return batch
+
+
+class LengthBucketSampler:
+    """
+    batch_sampler of batches of rows of similar length.
+
+    With shuffle the rows are shuffled, taken in pools of pool_batches
+    batches, sorted by length inside every pool and cut into batches, and
+    the order of the batches is shuffled, so every epoch has other batches
+    in another order but each batch has rows of about the same length.
+    Without shuffle the rows are sorted by length once; order gives the row
+    of every position of the output, to put the predictions back in the
+    order of the dataset with restore_order.
+    """
+
+    def __init__(self, lengths, batch_size, shuffle=True, pool_batches=50, seed=12222):
+        """
+        :param lengths: sequence of int, length of every row (e.g. characters of the sentence)
+        :param batch_size: int, rows per batch
+        :param shuffle: bool, new batches in random order every epoch, for training
+        :param pool_batches: int, batches sorted together when shuffling
+        :param seed: int, seed of the first epoch, incremented every epoch
+        """
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.pool_batches = pool_batches
+        self.seed = seed
+        self.epoch = 0
+        self.order = np.argsort(self.lengths, kind="stable")
+
+    def __len__(self):
+        return math.ceil(len(self.lengths) / self.batch_size)
+
+    def __iter__(self):
+        if not self.shuffle:
+            for start in range(0, len(self.order), self.batch_size):
+                yield self.order[start:start + self.batch_size].tolist()
+            return
+        rng = np.random.RandomState(self.seed + self.epoch)
+        self.epoch += 1
+        rows = rng.permutation(len(self.lengths))
+        pool_size = self.batch_size * self.pool_batches
+        batches = []
+        for start in range(0, len(rows), pool_size):
+            pool = rows[start:start + pool_size]
+            pool = pool[np.argsort(self.lengths[pool], kind="stable")]
+            batches.extend(pool[i:i + self.batch_size] for i in range(0, len(pool), self.batch_size))
+        for i in rng.permutation(len(batches)):
+            yield batches[i].tolist()
+
+
+def restore_order(values, order):
+    """
+    :param values: sequence, one value per row in the order the batches gave them
+    :param order: sequence of int, row of every position (LengthBucketSampler.order)
+    :return: list, values in the order of the rows
+    """
+    restored = [None] * len(values)
+    for position, row in enumerate(order):
+        restored[row] = values[position]
+    return restored
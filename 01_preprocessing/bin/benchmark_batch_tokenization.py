@@ -0,0 +1,121 @@
+"""
+Benchmark of the per-item tokenization of RelationExtractionDataset against BatchCollator.
+
+- per_item: one tokenizer call per sentence with return_tensors and a
+  squeeze of every tensor, as __getitem__ did, then the batch is stacked as
+  the default collate_fn of the DataLoader does.
+- collate: BatchCollator, one tokenizer call per batch.
+
+Both go over the curated E. coli dataset in batches of batch_size, the
+sequence classification tokenizers with sentence_tagged and LUKE with the
+sentence and its entity spans, and the batches of both are compared.
+Tensors are torch tensors when torch is installed, numpy arrays otherwise.
+
+The second table gives the share of pad tokens of the same data with
+padding="max_length", with padding=True over batches in the order of the
+dataset, and with padding=True over the batches of LengthBucketSampler.
+
+Usage: python benchmark_batch_tokenization.py [tokenizer ...]
+"""
+import sys
+import time
+
+import numpy as np
+
+from batch_tokenization import BatchCollator, LengthBucketSampler
+from columnar_dataset import read_arrow
+from model_arrays import load_tokenizer
+
+dataset_path = "../results/ECO_dataset_master_curated_whole_tagging_info_with_span_data_v2.arrow"
+tokenizer_names = ["bert-base-uncased", "dmis-lab/biobert-v1.1", "studio-ousia/luke-base"]
+batch_size = 32
+
+try:
+    import torch
+    return_tensors = "pt"
+except ImportError:
+    torch = None
+    return_tensors = "np"
+
+
+def get_tokenizer(name):
+    """LukeTokenizer for entity pair classification for LUKE, AutoTokenizer for the others."""
+    if "luke" in name.lower():
+        return load_tokenizer(name)
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(name)
+
+
+def per_item_batch(tokenizer, items):
+    """Encoding of every item as __getitem__ did it, stacked as the default collate_fn."""
+    encodings = []
+    for item in items:
+        kwargs = {"entity_spans": item["entity_spans"]} if "entity_spans" in item else {}
+        encoding = tokenizer(item["sentence"], padding="max_length", truncation=True, return_tensors=return_tensors,
+                             **kwargs)
+        encodings.append({k: v.squeeze() for k, v in encoding.items()})
+    stack = torch.stack if torch is not None else np.stack
+    return {k: stack([encoding[k] for encoding in encodings]) for k in encodings[0]}
+
+
+def get_items(name, data):
+    """Items of RelationExtractionDataset for the tokenizer name."""
+    if "luke" in name.lower():
+        return [{"sentence": sentence, "entity_spans": [tuple(int(x) for x in span) for span in spans]}
+                for sentence, spans in zip(data['SENTENCE'], data['span_regulator_regulated'])]
+    return [{"sentence": sentence} for sentence in data['sentence_tagged']]
+
+
+def padding_ratios(tokenizer, items):
+    """
+    :return: dict, padding scheme -> (padding_ratio, mean tokens per row of the batches, seconds)
+    """
+    lengths = [len(item["sentence"]) for item in items]
+    in_order = [list(range(start, min(start + batch_size, len(items)))) for start in range(0, len(items), batch_size)]
+    schemes = [("max_length", "max_length", in_order), ("dynamic", True, in_order),
+               ("bucketed", True, list(LengthBucketSampler(lengths, batch_size, shuffle=True)))]
+    ratios = {}
+    for scheme, padding, batches in schemes:
+        collate = BatchCollator(tokenizer, padding=padding, return_tensors="np")
+        start = time.perf_counter()
+        for batch in batches:
+            collate([items[idx] for idx in batch])
+        elapsed = time.perf_counter() - start
+        report = collate.padding_report()
+        ratios[scheme] = (report["padding_ratio"], report["positions"] / report["rows"], elapsed)
+    return ratios
+
+
+def main():
+    names = sys.argv[1:] or tokenizer_names
+    data = read_arrow(dataset_path, columns=['SENTENCE', 'sentence_tagged', 'span_regulator_regulated'])
+    print("tokenizer\trows\tbatch_size\tper_item_samples_s\tcollate_samples_s\tspeedup\tsame_batches")
+    for name in names:
+        tokenizer = get_tokenizer(name)
+        items = get_items(name, data)
+        batches = [items[start:start + batch_size] for start in range(0, len(items), batch_size)]
+        collate = BatchCollator(tokenizer, return_tensors=return_tensors)
+
+        start = time.perf_counter()
+        per_item = [per_item_batch(tokenizer, batch) for batch in batches]
+        per_item_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        collated = [collate(batch) for batch in batches]
+        collate_time = time.perf_counter() - start
+
+        same = all(all(np.array_equal(np.asarray(a[k]), np.asarray(b[k])) for k in a)
+                   for a, b in zip(per_item, collated))
+        print("{}\t{}\t{}\t{:.0f}\t{:.0f}\t{:.1f}\t{}".format(
+            name, len(items), batch_size, len(items) / per_item_time, len(items) / collate_time,
+            per_item_time / collate_time, same))
+
+    print("\ntokenizer\tpadding\tpadding_ratio\ttokens_per_row\tseconds")
+    for name in names:
+        tokenizer = get_tokenizer(name)
+        for scheme, (ratio, tokens_per_row, seconds) in padding_ratios(tokenizer, get_items(name, data)).items():
+            print("{}\t{}\t{:.3f}\t{:.1f}\t{:.2f}".format(name, scheme, ratio, tokens_per_row, seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Time of the per-row span loop of preprocessing_for_luke_of_ecoli.ipynb
+against derive_spans (same loop with the validation counters) on the curated
+E. coli dataset replicated up to 100k+ rows.
+
+Before timing, the spans of derive_spans are checked against the str.split()
+offsets on sentences with non-ASCII characters (full-width brackets, CJK
+text, U+3000, U+2028, no-break spaces); the script exits with status 1 if
+they differ.
+
+Usage: python benchmark_ecoli_spans.py [curated_dataset.pkl]
+"""
+import sys
+import time
+
+import pandas as pd
+
+from ecoli_spans import FOUND_COLUMNS, REGULATED_TAG, SPAN_COLUMN, TF_TAG, derive_spans
+
+curated_path = "../results/ECO_dataset_master_curated_whole_tagging_info_with_span_data_serialized_4_v2.pkl"
+
+# (sentence, TF, regulated gene) with non-ASCII characters inside and between the tokens
+non_ascii_rows = [
+    ("ArcA（protein） represses the cydAB operon", "ArcA（protein）", "cydAB"),
+    ("Fnr activates narG　in anaerobiosis", "Fnr", "narG"),
+    ("CRP\u2028binds the lacZ promoter", "CRP", "lacZ"),
+    ("OmpR\u00a0regulates ompF (外膜蛋白) and ompC", "OmpR", "ompF"),
+    ("Lrp\u2003controls ilvIH-β expression", "Lrp", "ilvIH-β"),
+    ("σ54 depends on NtrC\u3000and glnA", "NtrC", "glnA"),
+]
+
+
+def split_offsets(sentence):
+    """
+    :param sentence: str
+    :return: list of (start, end) of the tokens of sentence.split()
+    """
+    offsets = []
+    position = 0
+    for token in sentence.split():
+        position = sentence.index(token, position)
+        offsets.append((position, position + len(token)))
+        position += len(token)
+    return offsets
+
+
+def check_non_ascii():
+    """
+    :return: bool, the spans of derive_spans are the str.split() offsets
+    """
+    sentences = [sentence for sentence, _, _ in non_ascii_rows]
+    tagged = []
+    expected = []
+    for sentence, tf, regulated in non_ascii_rows:
+        tokens = sentence.split()
+        tf_pos, regulated_pos = tokens.index(tf), tokens.index(regulated)
+        offsets = split_offsets(sentence)
+        tokens[tf_pos], tokens[regulated_pos] = TF_TAG, REGULATED_TAG
+        tagged.append(" ".join(tokens))
+        expected.append([list(offsets[tf_pos]), list(offsets[regulated_pos])])
+    data = pd.DataFrame({"SENTENCE": sentences, "sentence_tagged": tagged,
+                         "REGULATOR": [tf for _, tf, _ in non_ascii_rows],
+                         "REGULATED": [regulated for _, _, regulated in non_ascii_rows]})
+    result, counters = derive_spans(data)
+    spans_ok = result[SPAN_COLUMN].tolist() == expected
+    mismatches_ok = counters["regulator_mismatch"] == 0 and counters["regulated_mismatch"] == 0
+    print("non_ascii_rows: {}, spans as str.split: {}, no mismatch counted: {}".format(
+        len(non_ascii_rows), spans_ok, mismatches_ok))
+    return spans_ok and mismatches_ok
+
+
+def get_start_end(pos, list_sent):
+    """get_start_end of the notebook."""
+    start = sum(len(token) for token in list_sent[:pos]) + pos
+    return start, start + len(list_sent[pos])
+
+
+def notebook_spans(data):
+    """Loop of the notebook, without the prints."""
+    span_list = []
+    regulator_list = []
+    regulated_list = []
+    for sentence, tagged in zip(data["SENTENCE"], data["sentence_tagged"]):
+        list_sent = sentence.split()
+        list_tagged = tagged.split()
+        start_tf, end_tf = get_start_end(list_tagged.index(TF_TAG), list_sent)
+        start_regulated, end_regulated = get_start_end(list_tagged.index(REGULATED_TAG), list_sent)
+        span_list.append([[start_tf, end_tf], [start_regulated, end_regulated]])
+        regulator_list.append(sentence[start_tf:end_tf])
+        regulated_list.append(sentence[start_regulated:end_regulated])
+    return span_list, regulator_list, regulated_list
+
+
+def main():
+    if not check_non_ascii():
+        sys.exit(1)
+    path = sys.argv[1] if len(sys.argv) > 1 else curated_path
+    data = pd.read_pickle(path).drop(columns=[SPAN_COLUMN, *FOUND_COLUMNS])
+    print("rows\tloop_s\tderive_s\tloop_over_derive")
+    for factor in (1, 10, 100):
+        replicated = pd.concat([data] * factor, ignore_index=True)
+        start = time.perf_counter()
+        notebook_spans(replicated)
+        loop_time = time.perf_counter() - start
+        start = time.perf_counter()
+        derive_spans(replicated)
+        derive_time = time.perf_counter() - start
+        print("{}\t{:.3f}\t{:.3f}\t{:.2f}".format(len(replicated), loop_time, derive_time, loop_time / derive_time))
+
+
+if __name__ == "__main__":
+    main()
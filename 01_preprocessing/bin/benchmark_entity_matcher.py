@@ -0,0 +1,183 @@
+"""
+Benchmark of the single-pass EntityMatcher against the per-entity regex search
+originally used in preprocessing_articles_for_LUKE_from_entity_lists.py.
+
+The real STM_tfs.tsv and STM_regulated.tsv lists are grown with synthetic names
+(real name + numeric suffix) from their original size (~90 TFs / ~350 regulated)
+up to genome-wide sizes, and both approaches scan the same synthetic sentences.
+The spans of both approaches are compared line by line, and the token
+prefilter (lines without TF or without regulated gene skip the regex) is timed
+on top of the matcher, checking it gives the same number of candidate pairs.
+
+A second table adds synthetic aliases (several per real name) with
+case-insensitive matching and the variant delimiters of entity_dictionary.py,
+to check that the scan time stays about the same as the dictionary grows.
+
+A third table scans the lines for several organisms: every synthetic
+organism shares most names with the real lists and has its own names too.
+One EntityMatcher per organism is compared with one OrganismMatcher for all
+of them, checking that every organism gets the same hits.
+
+Usage: python benchmark_entity_matcher.py [n_lines]
+"""
+import random
+import re
+import sys
+import time
+
+import pandas as pd
+
+from entity_dictionary import VARIANT_DELIMITERS, DictionaryRules
+from entity_matcher import EntityMatcher
+from organism_registry import Organism, OrganismMatcher
+
+tf_list_path = "../../datasets/STM_tfs.tsv"
+regulated_list_path = "../../datasets/STM_regulated.tsv"
+
+# Factors applied to the size of both lists, x13 gives ~4500 regulated genes
+scale_factors = [1, 2, 4, 8, 13]
+# Aliases per real name
+alias_factors = [0, 1, 4, 16, 64]
+# Organisms scanned together, and the share of the real names each one has
+organism_counts = [1, 2, 4, 8]
+shared_names = 0.7
+filler = ("the of and in expression gene was by to protein regulation promoter "
+          "binding , . ( ) - that is activated repressed mutant strain").split()
+
+
+def legacy_find(line, tfs, regulated):
+    """Per-entity search as it was done before EntityMatcher."""
+    spans_tf = []
+    spans_regulated = []
+    for tf in tfs:
+        for match in re.finditer(r' (?P<tf>' + tf + ') ', line):
+            spans_tf.append(list(match.span()))
+    if spans_tf:
+        for gene in regulated:
+            for match in re.finditer(r' (?P<regulated>' + gene + ') ', line):
+                spans_regulated.append(list(match.span()))
+    return spans_tf, spans_regulated
+
+
+def grow(names, factor):
+    """Add synthetic names until the list is factor times its original size."""
+    grown = list(names)
+    for copy in range(1, factor):
+        grown.extend("{}{}".format(name, copy) for name in names)
+    return grown
+
+
+def make_aliases(names, factor):
+    """Synthetic aliases (name + "-v" + number) of every name."""
+    return {"{}-v{}".format(name, copy): name for name in names for copy in range(factor)}
+
+
+def make_organisms(tfs, regulated, n_organisms, rng):
+    """Synthetic organisms: a sample of the real names plus names of their own (name + "_o" + number)."""
+    organisms = []
+    for number in range(n_organisms):
+        lists = []
+        for names in (tfs, regulated):
+            shared = rng.sample(names, int(len(names) * shared_names))
+            own = ["{}_o{}".format(name, number) for name in rng.sample(names, len(names) - len(shared))]
+            lists.append(shared + own)
+        organisms.append(Organism("o{}".format(number), lists[0], lists[1]))
+    return organisms
+
+
+def make_lines(tfs, regulated, n_lines, rng):
+    """Sentences of filler words with a few real entity names in them."""
+    lines = []
+    for _ in range(n_lines):
+        words = [rng.choice(filler) for _ in range(rng.randint(15, 40))]
+        for _ in range(rng.randint(0, 3)):
+            words.insert(rng.randrange(len(words) + 1), rng.choice(tfs))
+        for _ in range(rng.randint(0, 4)):
+            words.insert(rng.randrange(len(words) + 1), rng.choice(regulated))
+        lines.append(" ".join(words))
+    return lines
+
+
+def main():
+    n_lines = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    rng = random.Random(12222)
+    tfs = list(pd.read_csv(tf_list_path, sep="\t")['0'])
+    regulated = list(pd.read_csv(regulated_list_path, sep="\t")['0'])
+    lines = make_lines(tfs, regulated, n_lines, rng)
+
+    print("lines\ttfs\tregulated\tlegacy_s\tmatcher_build_s\tmatcher_s\tprefilter_matcher_s\tspeedup\tsame_spans\tsame_pairs")
+    for factor in scale_factors:
+        big_tfs = grow(tfs, factor)
+        big_regulated = grow(regulated, factor)
+
+        start = time.perf_counter()
+        legacy = [legacy_find(line, big_tfs, big_regulated) for line in lines]
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        matcher = EntityMatcher(big_tfs, big_regulated)
+        build_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        found = []
+        for line in lines:
+            spans_tf, spans_regulated = matcher.find(line)
+            # The legacy search only looks for regulated genes when a TF was found
+            found.append((spans_tf, spans_regulated if spans_tf else []))
+        matcher_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        n_pairs = 0
+        for line in lines:
+            if matcher.prefilter(line) is None:
+                spans_tf, spans_regulated = matcher.find(line)
+                n_pairs += len(spans_tf) * len(spans_regulated)
+        prefilter_time = time.perf_counter() - start
+        legacy_pairs = sum(len(spans_tf) * len(spans_regulated) for spans_tf, spans_regulated in legacy)
+
+        print("{}\t{}\t{}\t{:.3f}\t{:.3f}\t{:.3f}\t{:.3f}\t{:.1f}\t{}\t{}".format(
+            n_lines, len(big_tfs), len(big_regulated), legacy_time, build_time,
+            matcher_time, prefilter_time, legacy_time / matcher_time, found == legacy,
+            n_pairs == legacy_pairs))
+
+    print()
+    print("lines\taliases\tsurface_forms\tmatcher_build_s\tmatcher_s\tpairs")
+    for factor in alias_factors:
+        rules = DictionaryRules(make_aliases(tfs + regulated, factor), True, VARIANT_DELIMITERS, False)
+        start = time.perf_counter()
+        matcher = EntityMatcher(tfs, regulated, rules)
+        build_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        n_pairs = 0
+        for line in lines:
+            spans_tf, spans_regulated = matcher.find(line)
+            n_pairs += len(spans_tf) * len(spans_regulated)
+        matcher_time = time.perf_counter() - start
+        print("{}\t{}\t{}\t{:.3f}\t{:.3f}\t{}".format(
+            n_lines, len(rules.aliases), len(matcher.entries), build_time, matcher_time, n_pairs))
+
+    print()
+    print("lines\torganisms\tsurface_forms\tseparate_s\torganism_matcher_s\tspeedup\tsame_hits")
+    for n_organisms in organism_counts:
+        organisms = make_organisms(tfs, regulated, n_organisms, rng)
+        organism_lines = make_lines([name for organism in organisms for name in organism.tfs],
+                                    [name for organism in organisms for name in organism.regulated], n_lines, rng)
+        matchers = {organism.name: EntityMatcher(organism.tfs, organism.regulated) for organism in organisms}
+        organism_matcher = OrganismMatcher(organisms)
+
+        start = time.perf_counter()
+        separate = [{name: matcher.find_entities(line) for name, matcher in matchers.items()}
+                    for line in organism_lines]
+        separate_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        together = [organism_matcher.find_entities(line) for line in organism_lines]
+        together_time = time.perf_counter() - start
+        print("{}\t{}\t{}\t{:.3f}\t{:.3f}\t{:.1f}\t{}".format(
+            n_lines, n_organisms, len(organism_matcher.matcher.entries), separate_time, together_time,
+            separate_time / together_time, separate == together))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Recall of the token-boundary spans of EntityMatcher against the original
+per-entity search ``re.finditer(' (' + name + ') ', line)`` on the sentences
+of the 264-PMID corpus (datasets/STM_data_set_dl_articles_264_preprocessed_for_luke).
+
+Both searches run over the same sentences with STM_tfs.tsv and
+STM_regulated.tsv. Hits are compared by the exact position of the name (the
+legacy spans include the surrounding spaces), and every hit that only the new
+scan finds is classified: at the start or end of the line, or sharing a space
+with the previous hit of the same name (adjacent repeats such as
+" hilA hilA "). The corpus only keeps the sentences that already had a pair
+with the original search, so the sentences it missed completely are not
+counted here: the gain is a lower bound.
+
+Usage: python benchmark_entity_recall.py [corpus.arrow]
+"""
+import sys
+import time
+from collections import Counter
+
+import pandas as pd
+
+from benchmark_entity_matcher import legacy_find
+from columnar_dataset import read_arrow
+from entity_dictionary import VERBATIM
+from entity_matcher import EntityMatcher
+
+tf_list_path = "../../datasets/STM_tfs.tsv"
+regulated_list_path = "../../datasets/STM_regulated.tsv"
+corpus_path = "../../datasets/STM_data_set_dl_articles_264_preprocessed_for_luke.arrow"
+
+
+def exact(spans):
+    """Legacy spans without the surrounding spaces."""
+    return [(span[0] + 1, span[1] - 1) for span in spans]
+
+
+def classify(line, start, end, previous_ends):
+    """Why the original search missed a hit."""
+    if start == 0:
+        return "line_start"
+    if end == len(line):
+        return "line_end"
+    if start - 1 in previous_ends:
+        return "shared_space"
+    return "other"
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else corpus_path
+    tfs = list(pd.read_csv(tf_list_path, sep="\t")['0'])
+    regulated = list(pd.read_csv(regulated_list_path, sep="\t")['0'])
+    lines = list(read_arrow(path, columns=["sentence"])["sentence"].unique())
+
+    start = time.perf_counter()
+    legacy = [legacy_find(line, tfs, regulated) for line in lines]
+    legacy_time = time.perf_counter() - start
+
+    matcher = EntityMatcher(tfs, regulated, VERBATIM._replace(legacy_spans=False))
+    start = time.perf_counter()
+    found = [matcher.find(line) for line in lines]
+    matcher_time = time.perf_counter() - start
+
+    legacy_pairs = 0
+    new_pairs = 0
+    kept_pairs = 0
+    new_only_hits = Counter()
+    lost_hits = 0
+    for line, (legacy_tf, legacy_regulated), (spans_tf, spans_regulated) in zip(lines, legacy, found):
+        old = {"tf": set(exact(legacy_tf)), "regulated": set(exact(legacy_regulated) if legacy_tf else [])}
+        new = {"tf": {tuple(span) for span in spans_tf}, "regulated": {tuple(span) for span in spans_regulated}}
+        legacy_pairs += len(old["tf"]) * len(old["regulated"])
+        new_pairs += len(new["tf"]) * len(new["regulated"])
+        kept_pairs += len(old["tf"] & new["tf"]) * len(old["regulated"] & new["regulated"])
+        for kind in ("tf", "regulated"):
+            lost_hits += len(old[kind] - new[kind])
+            # The original search only looked for regulated genes when a TF was found
+            if kind == "regulated" and not legacy_tf:
+                new_only_hits["no_tf_found"] += len(new[kind])
+                continue
+            ends = {end for _, end in new[kind]}
+            for span in sorted(new[kind] - old[kind]):
+                new_only_hits[classify(line, span[0], span[1], ends)] += 1
+
+    print("sentences\t{}".format(len(lines)))
+    print("legacy_pairs\t{}".format(legacy_pairs))
+    print("token_boundary_pairs\t{}".format(new_pairs))
+    print("legacy_pairs_kept\t{}".format(kept_pairs))
+    print("legacy_hits_lost\t{}".format(lost_hits))
+    print("pair_recall_gain\t{:.2%}".format(new_pairs / legacy_pairs - 1 if legacy_pairs else 0.0))
+    for reason, count in new_only_hits.most_common():
+        print("new_hits_{}\t{}".format(reason, count))
+    print("legacy_s\t{:.3f}".format(legacy_time))
+    print("matcher_s\t{:.3f}".format(matcher_time))
+
+
+if __name__ == "__main__":
+    main()
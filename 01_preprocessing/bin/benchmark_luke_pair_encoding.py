@@ -0,0 +1,79 @@
+"""
+Parity check and benchmark of LukePairEncoder against LukeTokenizer.
+
+Both encode the same pairs in batches of batch_size, with the padding of
+the model arrays ("max_length") and of the collate_fn (True), and every
+array of every batch is compared. The pairs are the curated E. coli
+dataset, or the pairs of a normalized dataset (LukePairs) written by the
+preprocessing of the articles, where a sentence has most of the time
+several pairs. The script exits with status 1 if any batch differs.
+
+Usage: python benchmark_luke_pair_encoding.py [tokenizer] [normalized_dataset_dir]
+"""
+import sys
+import time
+
+import numpy as np
+
+from columnar_dataset import read_arrow
+from luke_pair_encoding import LukePairEncoder
+from model_arrays import load_tokenizer
+from normalized_dataset import LukePairs
+
+dataset_path = "../results/ECO_dataset_master_curated_whole_tagging_info_with_span_data_v2.arrow"
+tokenizer_name = "studio-ousia/luke-base"
+batch_size = 32
+
+
+def read_pairs(dataset_dir=None):
+    """
+    :param dataset_dir: str, normalized dataset, None for the curated E. coli dataset
+    :return: tuple, (sentences, entity_spans) of every pair
+    """
+    if dataset_dir is None:
+        data = read_arrow(dataset_path, columns=['SENTENCE', 'span_regulator_regulated'])
+        return list(data['SENTENCE']), [[tuple(int(x) for x in span) for span in spans]
+                                        for spans in data['span_regulator_regulated']]
+    pairs = LukePairs(dataset_dir)
+    rows = [pairs[idx] for idx in range(len(pairs))]
+    return [row.sentence for row in rows], [[tuple(span) for span in row.entity_spans] for row in rows]
+
+
+def encode_batches(encode, sentences, entity_spans, padding):
+    """
+    :return: tuple, (list of dict of numpy arrays, one per batch, seconds)
+    """
+    batches = []
+    start = time.perf_counter()
+    for idx in range(0, len(sentences), batch_size):
+        encoding = encode(sentences[idx:idx + batch_size], entity_spans=entity_spans[idx:idx + batch_size],
+                          padding=padding, truncation=True)
+        batches.append({name: np.array(encoding[name]) for name in encoding.keys()})
+    return batches, time.perf_counter() - start
+
+
+def main():
+    name = sys.argv[1] if len(sys.argv) > 1 else tokenizer_name
+    dataset_dir = sys.argv[2] if len(sys.argv) > 2 else None
+    sentences, entity_spans = read_pairs(dataset_dir)
+    tokenizer = load_tokenizer(name)
+    print("pairs: {}, sentences: {}, pairs per sentence: {:.1f}".format(
+        len(sentences), len(set(sentences)), len(sentences) / len(set(sentences))))
+    print("padding\ttokenizer_pairs_s\tencoder_pairs_s\tspeedup\ttokenized_pieces\tsame_batches")
+    same_all = True
+    for padding in ("max_length", True):
+        encoder = LukePairEncoder(tokenizer)
+        expected, tokenizer_time = encode_batches(tokenizer, sentences, entity_spans, padding)
+        encoded, encoder_time = encode_batches(encoder, sentences, entity_spans, padding)
+        same = all(a.keys() == b.keys() and all(np.array_equal(a[k], b[k]) for k in a)
+                   for a, b in zip(expected, encoded))
+        same_all = same_all and same
+        print("{}\t{:.0f}\t{:.0f}\t{:.1f}\t{:.3f}\t{}".format(
+            padding, len(sentences) / tokenizer_time, len(sentences) / encoder_time, tokenizer_time / encoder_time,
+            encoder.stats["tokenized_pieces"] / encoder.stats["pieces"], same))
+    if not same_all:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
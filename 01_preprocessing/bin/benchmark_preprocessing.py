@@ -0,0 +1,206 @@
+"""
+Benchmark suite of the article preprocessing on a synthetic corpus.
+
+The real STM_tfs.tsv and STM_regulated.tsv lists are grown with synthetic
+names (as in benchmark_entity_matcher.py) and a directory of synthetic
+articles (<PMID>.txt, one sentence per line, filler words with real names
+in them) is written for every configuration, so no server path is needed.
+Each stage of preprocessing_articles_for_LUKE_from_entity_lists.py is timed
+on its own over the whole corpus:
+
+- read: reading the lines of every article.
+- match: token prefilter and entity scan of every line.
+- pair: candidate pairs and output rows of the lines with TF and regulated gene.
+- write: appending the rows to the output TSV with StreamingTSVWriter.
+- end_to_end: process_articles (n_workers processes) and the TSV writer, as the script does.
+
+Every run is appended to a JSON history (a list of runs with the date,
+commit, label, configuration and results) and compared with the last run of
+the same configuration, so a matcher or I/O change can be checked against
+the numbers of the previous ones. The history depends on the machine and is
+not in the repository: the first run creates it, e.g. a baseline before a
+change and a run after it:
+
+    python benchmark_preprocessing.py 200 1 baseline
+    python benchmark_preprocessing.py 200 1 after-change
+
+Usage: python benchmark_preprocessing.py [n_articles] [n_workers] [label]
+"""
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from article_processing import article_pmid, process_articles
+from benchmark_entity_matcher import grow, make_lines
+from entity_matcher import EntityMatcher
+from luke_output import StreamingTSVWriter
+from pair_pruning import candidate_pairs
+
+tf_list_path = "../../datasets/STM_tfs.tsv"
+regulated_list_path = "../../datasets/STM_regulated.tsv"
+history_path = "../results/benchmark_preprocessing_history.json"
+
+# Factors applied to the size of both lists, x13 gives ~4500 regulated genes
+scale_factors = [1, 4, 13]
+sentences_per_article = 150
+chunk_rows = 10000
+stages = ["read_s", "match_s", "pair_s", "write_s", "end_to_end_s"]
+
+
+def make_corpus(corpus_dir, tfs, regulated, n_articles, rng):
+    """
+    Write the entity lists and the articles of a synthetic corpus.
+
+    :param corpus_dir: str, output directory, gets tfs.tsv, regulated.tsv and articles/
+    :param tfs: list, transcription factor names
+    :param regulated: list, regulated gene names
+    :param n_articles: int, number of articles
+    :param rng: random.Random
+    :return: list of str, paths of the articles
+    """
+    pd.DataFrame({'0': tfs}).to_csv(os.path.join(corpus_dir, "tfs.tsv"), sep="\t", index=False)
+    pd.DataFrame({'0': regulated}).to_csv(os.path.join(corpus_dir, "regulated.tsv"), sep="\t", index=False)
+    articles_dir = os.path.join(corpus_dir, "articles")
+    os.makedirs(articles_dir, exist_ok=True)
+    paths = []
+    for number in range(n_articles):
+        path = os.path.join(articles_dir, "{}.txt".format(30000000 + number))
+        with open(path, "w") as f:
+            for line in make_lines(tfs, regulated, sentences_per_article, rng):
+                f.write(line + "\n")
+        paths.append(path)
+    return paths
+
+
+def time_stages(paths, tfs, regulated, output_path, n_workers):
+    """
+    :param paths: list, paths of the articles
+    :param tfs: list, transcription factor names
+    :param regulated: list, regulated gene names
+    :param output_path: str, TSV written by the write and end_to_end stages
+    :param n_workers: int, processes of the end_to_end stage
+    :return: dict, seconds of every stage plus sentences and pairs of the corpus
+    """
+    result = {}
+    start = time.perf_counter()
+    articles = []
+    for path in paths:
+        with open(path) as f:
+            articles.append((os.path.basename(path), [line.rstrip("\n") for line in f]))
+    result["read_s"] = time.perf_counter() - start
+
+    # Compiling the lists is part of the match stage, as in every run of the script
+    start = time.perf_counter()
+    matcher = EntityMatcher(tfs, regulated)
+    hits = []
+    for file, lines in articles:
+        for n_line, line in enumerate(lines, 1):
+            if matcher.prefilter(line) is None:
+                hits.append((file, n_line, line, matcher.find(line)))
+    result["match_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    rows = {}
+    for file, n_line, line, (spans_tf, spans_regulated) in hits:
+        if spans_tf and spans_regulated:
+            article_rows = rows.setdefault(file, [])
+            for elem in candidate_pairs(line, spans_tf, spans_regulated, margin=matcher.margin,
+                                         delimiters=matcher.delimiters):
+                article_rows.append((line, elem, line[elem[0][0]:elem[0][1]], line[elem[1][0]:elem[1][1]],
+                                     file, n_line, article_pmid(file)))
+    result["pair_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with StreamingTSVWriter(output_path, chunk_rows=chunk_rows) as writer:
+        for file, _ in articles:
+            writer.write_rows(rows.get(file, []))
+    result["write_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    n_pairs = 0
+    with StreamingTSVWriter(output_path, chunk_rows=chunk_rows) as writer:
+        for article in process_articles(paths, tfs, regulated, n_workers=n_workers):
+            writer.write_rows(article.rows)
+            n_pairs += len(article.rows)
+    result["end_to_end_s"] = time.perf_counter() - start
+
+    result["sentences"] = sum(len(lines) for _, lines in articles)
+    result["pairs"] = sum(len(article_rows) for article_rows in rows.values())
+    if n_pairs != result["pairs"]:
+        raise ValueError("end_to_end gave {} pairs, the stages {}".format(n_pairs, result["pairs"]))
+    result["sentences_per_s"] = result["sentences"] / result["end_to_end_s"]
+    return result
+
+
+def git_commit():
+    """Commit of the working tree, None outside of git."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def read_history(path):
+    """
+    :param path: str, JSON history
+    :return: list, previous runs, empty if there is no history yet
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    n_articles = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    n_workers = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    label = sys.argv[3] if len(sys.argv) > 3 else ""
+    rng = random.Random(12222)
+    tfs = list(pd.read_csv(tf_list_path, sep="\t")['0'])
+    regulated = list(pd.read_csv(regulated_list_path, sep="\t")['0'])
+
+    config = {"articles": n_articles, "sentences_per_article": sentences_per_article, "n_workers": n_workers,
+              "scale_factors": scale_factors, "chunk_rows": chunk_rows}
+    history = read_history(history_path)
+    previous = next((run for run in reversed(history) if run["config"] == config), None)
+
+    print("scale\ttfs\tregulated\tsentences\tpairs\t" + "\t".join(stages) + "\tsentences_per_s\tvs_previous")
+    results = []
+    for factor in scale_factors:
+        big_tfs = grow(tfs, factor)
+        big_regulated = grow(regulated, factor)
+        with tempfile.TemporaryDirectory() as corpus_dir:
+            paths = make_corpus(corpus_dir, big_tfs, big_regulated, n_articles, rng)
+            result = time_stages(paths, big_tfs, big_regulated, os.path.join(corpus_dir, "output.tsv"), n_workers)
+        result = dict({"scale": factor, "tfs": len(big_tfs), "regulated": len(big_regulated)}, **result)
+        results.append(result)
+        # Time of the previous run of the same configuration over the time of this one
+        before = next((x for x in previous["results"] if x["scale"] == factor), None) if previous else None
+        print("{}\t{}\t{}\t{}\t{}\t".format(factor, result["tfs"], result["regulated"], result["sentences"],
+                                            result["pairs"]) +
+              "\t".join("{:.3f}".format(result[stage]) for stage in stages) +
+              "\t{:.0f}\t{}".format(result["sentences_per_s"],
+                                    "{:.2f}x".format(before["end_to_end_s"] / result["end_to_end_s"])
+                                    if before else "-"))
+
+    history.append({"date": datetime.now().isoformat(timespec="seconds"), "commit": git_commit(), "label": label,
+                    "python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count(),
+                    "config": config, "results": results})
+    os.makedirs(os.path.dirname(history_path), exist_ok=True)
+    with open(history_path, "w") as f:
+        json.dump(history, f, indent=1)
+    print("Run {} written to {}{}".format(len(history), history_path, "" if previous is None else
+                                          ", compared with the run of {} {}".format(previous["date"], previous["label"])))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Micro-benchmark of the ways of collecting candidate pairs into a DataFrame.
+
+- at_growing: one DataFrame grown with one df.at[idx, col] call per column,
+  as the original preprocessing script did (quadratic, only run up to
+  max_at_rows pairs).
+- at_per_article: the same df.at calls on a new DataFrame per article of
+  ~pairs_per_article pairs.
+- columnar: LukeRowBuffer, DataFrame built once per batch of batch_rows pairs.
+
+Usage: python benchmark_row_accumulation.py [max_at_rows]
+"""
+import sys
+import time
+
+import pandas as pd
+
+from luke_output import LUKE_COLUMNS, LukeRowBuffer
+
+sizes = [10000, 100000, 1000000]
+pairs_per_article = 60
+batch_rows = 10000
+
+
+def make_rows(n_pairs):
+    sentence = "The results reported here show that the Hha and YdgT proteins also repress ssrA and ssrB expression ."
+    return [(sentence, [[39, 44], [74 + i % 9, 80 + i % 9]], " Hha ", " ssrA ", "{}.txt".format(i // pairs_per_article), i % 40,
+             str(i // pairs_per_article))
+            for i in range(n_pairs)]
+
+
+def at_growing(rows):
+    df = pd.DataFrame(columns=LUKE_COLUMNS)
+    for idx, row in enumerate(rows):
+        for col, value in zip(LUKE_COLUMNS, row):
+            df.at[idx, col] = value
+    return len(df)
+
+
+def at_per_article(rows):
+    n = 0
+    for start in range(0, len(rows), pairs_per_article):
+        df = pd.DataFrame(columns=LUKE_COLUMNS)
+        for idx, row in enumerate(rows[start:start + pairs_per_article], start):
+            for col, value in zip(LUKE_COLUMNS, row):
+                df.at[idx, col] = value
+        n += len(df)
+    return n
+
+
+def columnar(rows):
+    n = 0
+    buffer = LukeRowBuffer()
+    for start in range(0, len(rows), pairs_per_article):
+        buffer.extend(rows[start:start + pairs_per_article])
+        if len(buffer) >= batch_rows:
+            n += len(buffer.to_frame(n))
+            buffer.clear()
+    n += len(buffer.to_frame(n))
+    return n
+
+
+def main():
+    max_at_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    print("pairs\tmethod\tseconds\tpairs_per_s")
+    for n_pairs in sizes:
+        rows = make_rows(n_pairs)
+        for name, method in (("at_growing", at_growing), ("at_per_article", at_per_article), ("columnar", columnar)):
+            if method is at_growing and n_pairs > max_at_rows:
+                print("{}\t{}\tskipped (> {} pairs)\t".format(n_pairs, name, max_at_rows))
+                continue
+            start = time.perf_counter()
+            assert method(rows) == n_pairs
+            elapsed = time.perf_counter() - start
+            print("{}\t{}\t{:.3f}\t{:.0f}".format(n_pairs, name, elapsed, n_pairs / elapsed))
+
+
+if __name__ == "__main__":
+    main()
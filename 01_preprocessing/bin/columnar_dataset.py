@@ -0,0 +1,144 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from luke_output import read_luke_tsv
+
+# Columns with [[start_tf, end_tf], [start_regulated, end_regulated]]
+SPAN_COLUMNS = ('entity_spans', 'span_regulator_regulated')
+SPAN_TYPE = pa.list_(pa.list_(pa.int32(), 2), 2)
+
+
+def span_array(spans):
+    """
+    :param spans: iterable of [[start_tf, end_tf], [start_regulated, end_regulated]]
+    :return: pyarrow FixedSizeListArray of type SPAN_TYPE
+    """
+    flat = np.asarray([np.asarray(x, dtype=np.int32).reshape(2, 2) for x in spans], dtype=np.int32).reshape(-1)
+    return pa.FixedSizeListArray.from_arrays(pa.FixedSizeListArray.from_arrays(pa.array(flat), 2), 2)
+
+
+def write_arrow(df, arrow_path, max_chunksize=65536):
+    """
+    Write a dataset DataFrame as an uncompressed Arrow IPC file.
+
+    Span columns are stored as int32 arrays of shape (2, 2), the rest keep the
+    type inferred by Arrow (strings, integers, booleans; NaN as null).
+
+    :param df: pandas DataFrame, e.g. the curated E. coli set or the LUKE pairs
+    :param arrow_path: str, path of the .arrow file
+    :param max_chunksize: int, rows per record batch
+    """
+    arrays = []
+    for col in df.columns:
+        if col in SPAN_COLUMNS:
+            arrays.append(span_array(df[col]))
+        else:
+            arrays.append(pa.array(df[col], from_pandas=True))
+    table = pa.Table.from_arrays(arrays, names=[str(col) for col in df.columns])
+    with pa.OSFile(arrow_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=max_chunksize)
+
+
+def read_arrow_table(arrow_path, columns=None):
+    """
+    Memory-map an Arrow IPC file, nothing is copied until a column is used.
+
+    :param arrow_path: str, path of the .arrow file
+    :param columns: list, columns to keep, all if None
+    :return: pyarrow Table
+    """
+    if not os.path.exists(arrow_path):
+        # The .arrow copies of the pickles of the repository are written by convert_pickles_to_arrow.py
+        raise FileNotFoundError("{} does not exist, write it from its pickle with convert_pickles_to_arrow.py".format(
+            arrow_path))
+    with pa.memory_map(arrow_path, "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+    if columns is not None:
+        table = table.select(columns)
+    return table
+
+
+def spans_to_numpy(column):
+    """
+    :param column: pyarrow ChunkedArray of type SPAN_TYPE
+    :return: numpy int32 array of shape (n_rows, 2, 2)
+    """
+    column = column.combine_chunks() if column.num_chunks != 1 else column.chunk(0)
+    return column.flatten().flatten().to_numpy().reshape(-1, 2, 2)
+
+
+def stack_spans(spans):
+    """
+    :param spans: iterable of [[start_tf, end_tf], [start_regulated, end_regulated]] (lists, tuples or (2, 2) arrays)
+    :return: contiguous numpy int32 array of shape (n_rows, 2, 2)
+    """
+    spans = list(spans)
+    if not spans:
+        return np.zeros((0, 2, 2), dtype=np.int32)
+    return np.ascontiguousarray(np.stack([np.asarray(x, dtype=np.int32).reshape(2, 2) for x in spans]))
+
+
+class StringArray:
+    """
+    Strings of a column in one numpy buffer.
+
+    The column is stored as its UTF-8 bytes and the offsets of every
+    string, ``strings[idx]`` decodes one string. Unlike a list (or a pandas
+    Series) of str there is no Python object per row, so the DataLoader
+    workers forked from the main process read the buffer without touching
+    reference counts and the pages stay shared.
+    """
+
+    def __init__(self, strings):
+        """
+        :param strings: iterable of str
+        """
+        encoded = [str(x).encode("utf-8") for x in strings]
+        self.offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(x) for x in encoded], out=self.offsets[1:])
+        self.buffer = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __repr__(self):
+        return "StringArray({} strings, {} bytes)".format(len(self), len(self.buffer))
+
+    def __getitem__(self, idx):
+        return self.buffer[self.offsets[idx]:self.offsets[idx + 1]].tobytes().decode("utf-8")
+
+
+def read_arrow(arrow_path, columns=None):
+    """
+    Read only the given columns of an Arrow dataset into a DataFrame.
+
+    Every value of a span column is a (2, 2) int32 numpy array, the same
+    values the modelling scripts get with
+    ``df['entity_spans'].apply(lambda x: np.array(list(x)))``.
+
+    :param arrow_path: str, path of the .arrow file
+    :param columns: list, columns to read, all if None
+    :return: pandas DataFrame
+    """
+    table = read_arrow_table(arrow_path, columns)
+    data = {}
+    for name in table.column_names:
+        if table.schema.field(name).type == SPAN_TYPE:
+            data[name] = pd.Series(list(spans_to_numpy(table.column(name))), dtype=object)
+        else:
+            data[name] = table.column(name).to_pandas()
+    return pd.DataFrame(data, columns=table.column_names)
+
+
+def tsv_to_arrow(tsv_path, arrow_path):
+    """
+    Write the Arrow file of the LUKE dataset from the streamed TSV.
+
+    :param tsv_path: str, path of the TSV written by StreamingTSVWriter
+    :param arrow_path: str, path of the .arrow file
+    """
+    write_arrow(read_luke_tsv(tsv_path), arrow_path)
@@ -0,0 +1,48 @@
+"""
+Convert the pickled DataFrames of the pipeline (pickle protocol 4, pandas 1.3.5)
+into memory-mappable Arrow files with typed span columns.
+
+The .arrow files are not versioned: without arguments the two pickles of
+the repository are converted, once after cloning and again whenever a pickle
+is newer than its .arrow file, so the copies never drift from the pickles.
+
+Usage: python convert_pickles_to_arrow.py [input.pkl output.arrow]
+"""
+import os
+import sys
+
+import pandas as pd
+
+from columnar_dataset import read_arrow, write_arrow
+
+pickles = [
+    ("../results/ECO_dataset_master_curated_whole_tagging_info_with_span_data_serialized_4_v2.pkl",
+     "../results/ECO_dataset_master_curated_whole_tagging_info_with_span_data_v2.arrow"),
+    ("../../datasets/STM_data_set_dl_articles_264_preprocessed_for_luke.pkl",
+     "../../datasets/STM_data_set_dl_articles_264_preprocessed_for_luke.arrow"),
+]
+
+
+def convert(pkl_path, arrow_path):
+    df = pd.read_pickle(pkl_path)
+    write_arrow(df, arrow_path)
+    # Check that the Arrow file gives back the same values
+    converted = read_arrow(arrow_path)
+    assert list(converted.columns) == [str(col) for col in df.columns]
+    for col in df.columns:
+        for old, new in zip(df[col], converted[str(col)]):
+            if hasattr(new, "tolist"):
+                new = new.tolist()
+            assert old == new or (pd.isna(old) and pd.isna(new)), (col, old, new)
+    print("{} -> {} ({} rows, {} columns)".format(pkl_path, arrow_path, len(df), len(df.columns)))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        convert(sys.argv[1], sys.argv[2])
+    else:
+        for pkl_path, arrow_path in pickles:
+            if os.path.exists(arrow_path) and os.path.getmtime(arrow_path) >= os.path.getmtime(pkl_path):
+                print("{} is up to date".format(arrow_path))
+                continue
+            convert(pkl_path, arrow_path)
@@ -0,0 +1,141 @@
+"""
+Entity spans of the curated E. coli dataset with validation counters.
+
+It replaces the get_start_end() loop of preprocessing_for_luke_of_ecoli.ipynb
+with the same per-row rule: the span of a tag is the one of the token at the
+same position in the original sentence. The sentences with other whitespace
+than single spaces take the real token offsets, and the rows where the rule
+does not hold are counted instead of printed or raising ValueError.
+
+Usage: python ecoli_spans.py input.tsv output.tsv [output.arrow]
+"""
+import re
+import sys
+from collections import Counter
+
+import pandas as pd
+
+TF_TAG = "@TF$"
+REGULATED_TAG = "@Regulated$"
+# Columns added to the curated dataset, as the notebook did
+SPAN_COLUMN = 'span_regulator_regulated'
+FOUND_COLUMNS = ('regulator_span_found', 'regulated_span_found')
+# Tokens of str.split(), \s is the same set of characters as str.isspace()
+TOKEN = re.compile(r"\S+")
+
+
+def get_start_end(pos, list_sent):
+    """
+    Get the start position and end position of a tagged string inside the original sentence.
+
+    :param pos: int, index of the tagged word in the sentence
+    :param list_sent: list, the original sentence splitted into words, joined by single spaces in the sentence
+    :return: list, start idx and end idx of the tagged string
+    """
+    start = sum(map(len, list_sent[:pos])) + pos
+    return [start, start + len(list_sent[pos])]
+
+
+def row_spans(sentence, tagged, counters):
+    """
+    :param sentence: str, original sentence
+    :param tagged: str, sentence with @TF$ and @Regulated$
+    :param counters: Counter, validation counters, updated
+    :return: tuple, ([[start_tf, end_tf], [start_regulated, end_regulated]] with [-1, -1] for a span that cannot
+        be derived; bool, both spans derived)
+    """
+    list_sent = sentence.split()
+    list_tagged = tagged.split()
+    if len(list_tagged) != len(list_sent):
+        counters["token_count_mismatch"] += 1
+    offsets = None
+    # Sentences longer than their tokens joined by single spaces, the offsets of get_start_end() would shift
+    if sum(map(len, list_sent)) + max(len(list_sent) - 1, 0) != len(sentence):
+        counters["irregular_whitespace"] += 1
+        offsets = [list(match.span()) for match in TOKEN.finditer(sentence)]
+    spans = []
+    valid = True
+    for tag, name in ((TF_TAG, "tf"), (REGULATED_TAG, "regulated")):
+        n_tags = list_tagged.count(tag)
+        if n_tags > 1:
+            counters["multiple_{}_tags".format(name)] += 1
+        if n_tags == 0:
+            counters["missing_{}_tag".format(name)] += 1
+        elif list_tagged.index(tag) >= len(list_sent):
+            counters["tag_out_of_range"] += 1
+        else:
+            pos = list_tagged.index(tag)
+            spans.append(get_start_end(pos, list_sent) if offsets is None else offsets[pos])
+            continue
+        spans.append([-1, -1])
+        valid = False
+    return spans, valid
+
+
+def derive_spans(df, sentence_col='SENTENCE', tagged_col='sentence_tagged', regulator_col='REGULATOR',
+                 regulated_col='REGULATED', drop_invalid=True):
+    """
+    Add the span columns of LUKE to the curated dataset.
+
+    The span of a tag is the one of the token at the same position in the
+    original sentence. Validation counters:
+
+    - missing_tf_tag / missing_regulated_tag, tag_out_of_range: no span
+      can be derived, the row is invalid.
+    - multiple_tf_tags / multiple_regulated_tags: the first tag is used.
+    - token_count_mismatch: tagged and original sentences have a different
+      number of tokens (a tag replaced several words), spans after it shift.
+    - irregular_whitespace: the sentence has other whitespace than single
+      spaces, their spans come from the real token offsets (get_start_end()
+      gave shifted spans).
+    - regulator_mismatch / regulated_mismatch: the text of the span is not
+      the REGULATOR / REGULATED of the row.
+
+    :param df: pandas DataFrame, curated dataset with the original and tagged sentences
+    :param sentence_col: str, original sentences
+    :param tagged_col: str, sentences with @TF$ and @Regulated$
+    :param regulator_col: str, TF of the row, None to skip the check
+    :param regulated_col: str, regulated gene of the row, None to skip the check
+    :param drop_invalid: bool, drop the rows without a span instead of giving them [[-1, -1], [-1, -1]]
+    :return: tuple, (DataFrame with span_regulator_regulated, regulator_span_found and
+        regulated_span_found; Counter with the validation counters)
+    """
+    counters = Counter(rows=len(df))
+    regulators = df[regulator_col].tolist() if regulator_col is not None else None
+    regulated_genes = df[regulated_col].tolist() if regulated_col is not None else None
+    span_list = []
+    regulator_list = []
+    regulated_list = []
+    valid = []
+    for idx, (sentence, tagged) in enumerate(zip(df[sentence_col].tolist(), df[tagged_col].tolist())):
+        spans, row_valid = row_spans(sentence, tagged, counters)
+        regulator = sentence[spans[0][0]:spans[0][1]]
+        regulated = sentence[spans[1][0]:spans[1][1]]
+        if row_valid:
+            if regulators is not None and regulator != regulators[idx]:
+                counters["regulator_mismatch"] += 1
+            if regulated_genes is not None and regulated != regulated_genes[idx]:
+                counters["regulated_mismatch"] += 1
+        span_list.append(spans)
+        regulator_list.append(regulator)
+        regulated_list.append(regulated)
+        valid.append(row_valid)
+    counters["valid"] = sum(valid)
+
+    result = df.copy()
+    result[SPAN_COLUMN] = span_list
+    result[FOUND_COLUMNS[0]] = regulator_list
+    result[FOUND_COLUMNS[1]] = regulated_list
+    if drop_invalid:
+        result = result[valid]
+    return result, counters
+
+
+if __name__ == "__main__":
+    data = pd.read_csv(sys.argv[1], sep="\t")
+    data_span_cols, span_counters = derive_spans(data)
+    print(dict(span_counters))
+    data_span_cols.to_csv(sys.argv[2], sep="\t", index=False)
+    if len(sys.argv) > 3:
+        from columnar_dataset import write_arrow
+        write_arrow(data_span_cols, sys.argv[3])
@@ -0,0 +1,88 @@
+from collections import namedtuple
+
+import pandas as pd
+
+TF = "tf"
+REGULATED = "regulated"
+
+# Normalization rules of the entity dictionary
+#   aliases: dict, alias -> canonical name of STM_tfs.tsv or STM_regulated.tsv
+#   ignore_case: bool, "phoP" also matches the TF PhoP and "PhoP" the regulated gene phoP
+#   delimiters: str, characters that can surround an entity, " " is the original search
+#   legacy_spans: bool, spans include the delimiters and hits at line start / end or sharing a
+#     delimiter with a hit of the same entity are lost, as in the original ' (name) ' search
+DictionaryRules = namedtuple("DictionaryRules", ["aliases", "ignore_case", "delimiters", "legacy_spans"])
+VERBATIM = DictionaryRules({}, False, " ", True)
+# Hyphens, parentheses, slashes and punctuation: "ArcA-dependent", "(fnr)", "OmpR/EnvZ", "phoP."
+VARIANT_DELIMITERS = " ()[]{}/-,;:."
+
+
+def read_alias_table(alias_path):
+    """
+    :param alias_path: str, TSV with the columns alias and canonical
+    :return: dict, alias -> canonical name
+    """
+    df = pd.read_csv(alias_path, sep="\t", dtype=str, keep_default_na=False)
+    return dict(zip(df["alias"], df["canonical"]))
+
+
+class EntityDictionary:
+    """
+    Surface forms of both entity lists and the canonical entity of each one.
+
+    Every canonical name and every alias is a surface form. With ignore_case
+    the forms are lowercased, so the key of a hit is its lowercased text. A
+    key can stand for several entities, e.g. the TF PhoP and the regulated
+    gene phoP.
+    """
+
+    def __init__(self, tfs, regulated, rules=VERBATIM):
+        """
+        :param tfs: iterable of str, transcription factor names (STM_tfs.tsv)
+        :param regulated: iterable of str, regulated gene names (STM_regulated.tsv)
+        :param rules: DictionaryRules, aliases and normalization rules
+        """
+        self.tfs = [str(x) for x in tfs]
+        self.regulated = [str(x) for x in regulated]
+        self.rules = rules
+        canonical = {}
+        for kind, names in ((TF, self.tfs), (REGULATED, self.regulated)):
+            for idx, name in enumerate(names):
+                canonical.setdefault(name, []).append((kind, idx))
+        # Key of a surface form -> list of (kind, index in its list)
+        self.entries = {}
+        for name, keys in canonical.items():
+            self._add(name, keys)
+        # Aliases of names that are in neither list are not searched
+        self.unknown_aliases = []
+        for alias, name in rules.aliases.items():
+            if name in canonical:
+                self._add(alias, canonical[name])
+            else:
+                self.unknown_aliases.append(alias)
+
+    def _add(self, form, keys):
+        entries = self.entries.setdefault(self.key(form), [])
+        entries.extend(key for key in keys if key not in entries)
+
+    def key(self, surface):
+        """
+        :param surface: str, text of a hit or a surface form
+        :return: str, key of the form in entries
+        """
+        return surface.lower() if self.rules.ignore_case else surface
+
+    def canonical(self, kind, idx):
+        """
+        :param kind: str, TF or REGULATED
+        :param idx: int, index in its list
+        :return: str, name as it is in the entity list
+        """
+        return self.tfs[idx] if kind == TF else self.regulated[idx]
+
+    def tokens(self, kind):
+        """
+        :param kind: str, TF or REGULATED
+        :return: frozenset, keys of the surface forms of that kind
+        """
+        return frozenset(key for key, entries in self.entries.items() if any(k == kind for k, _ in entries))
@@ -0,0 +1,185 @@
+import re
+
+from entity_dictionary import REGULATED, TF, VERBATIM, EntityDictionary
+
+
+def build_trie_regex(names):
+    """
+    Build a single regular expression that matches any of the given names.
+
+    The names are stored in a character trie and the trie is written back as
+    nested non-capturing groups, so the regex engine branches on one character
+    at a time instead of trying every name at every position.
+
+    :param names: iterable of str, literal names (they are escaped)
+    :return: str, regular expression source
+    """
+    trie = {}
+    for name in names:
+        node = trie
+        for char in name:
+            node = node.setdefault(char, {})
+        # Empty key marks the end of a name
+        node[""] = {}
+
+    def to_regex(node):
+        # End of a name with no longer names below it
+        if list(node) == [""]:
+            return ""
+        alternatives = []
+        optional = False
+        for char in sorted(node):
+            if char == "":
+                optional = True
+            else:
+                alternatives.append(re.escape(char) + to_regex(node[char]))
+        if len(alternatives) == 1:
+            body = alternatives[0]
+            grouped = len(body) > 1
+        else:
+            body = "|".join(alternatives)
+            grouped = True
+        if grouped:
+            body = "(?:" + body + ")"
+        if optional:
+            body += "?"
+        return body
+
+    return to_regex(trie)
+
+
+class EntityMatcher:
+    """
+    Find transcription factors and regulated genes of a line in one scan.
+
+    It is built once from both entity lists and reproduces the spans of the
+    original per-entity search ``re.finditer(' (' + name + ') ', line)``:
+    every span includes the surrounding spaces, hits are ordered by the
+    position of the entity in its list and then by position in the line, and
+    a repeated name that shares a space with its previous hit is skipped.
+
+    The rules of an EntityDictionary add aliases, case-insensitive matching
+    and other delimiters than the space; all the surface forms go into the
+    same trie, so adding aliases barely changes the cost of a scan, and every
+    hit is mapped back to the canonical name of its list.
+
+    Without legacy_spans the spans are the exact [start, end] of the name.
+    The scan is zero-width at every token boundary, so adjacent entities
+    (" ArcA FNR "), entities at the start or end of the line and names that
+    start a longer form ("Crp" in "Crp-cAMP" with "-" as delimiter) are all
+    reported.
+    """
+
+    def __init__(self, tfs, regulated, rules=VERBATIM):
+        """
+        :param tfs: iterable of str, transcription factor names (STM_tfs.tsv)
+        :param regulated: iterable of str, regulated gene names (STM_regulated.tsv)
+        :param rules: DictionaryRules, aliases and normalization rules
+        """
+        self.dictionary = EntityDictionary(tfs, regulated, rules)
+        self.tfs = self.dictionary.tfs
+        self.regulated = self.dictionary.regulated
+        # Key of a surface form -> list of (kind, index in list), a name can be in both lists
+        self.entries = self.dictionary.entries
+        self.legacy_spans = rules.legacy_spans
+        # Characters of the delimiters around each span
+        self.margin = 1 if self.legacy_spans else 0
+        # Characters that separate the tokens, for the token distance of the pairs (pair_pruning.py)
+        self.delimiters = rules.delimiters
+        # Names are delimited by spaces (or the delimiters of the rules), the lookarounds keep them unconsumed
+        delimiters = "[" + re.escape(rules.delimiters) + "]"
+        flags = re.IGNORECASE if rules.ignore_case else 0
+        if self.legacy_spans:
+            self.pattern = re.compile("(?<=" + delimiters + ")" + build_trie_regex(self.entries) + "(?=" + delimiters + ")",
+                                      flags)
+        else:
+            # Zero-width match at every position preceded by a delimiter or the line start, the longest
+            # form followed by a delimiter or the line end is captured without consuming anything
+            not_delimiter = "[^" + re.escape(rules.delimiters) + "]"
+            self.pattern = re.compile("(?<!" + not_delimiter + ")(?=(" + build_trie_regex(self.entries) + ")(?!"
+                                      + not_delimiter + "))", flags)
+        # Key -> lengths of the shorter forms that are a prefix of it and end at a delimiter
+        self.prefixes = {}
+        for key in self.entries:
+            lengths = [i for i, char in enumerate(key) if char in rules.delimiters and key[:i] in self.entries]
+            if lengths:
+                self.prefixes[key] = lengths
+        # Hashed names for the token prefilter, only exact when no name has a delimiter
+        self.tf_tokens = self.dictionary.tokens(TF)
+        self.regulated_tokens = self.dictionary.tokens(REGULATED)
+        self.use_prefilter = not any(char in key for key in self.entries for char in rules.delimiters)
+        self.split = None if rules.delimiters == " " else re.compile(delimiters).split
+
+    def prefilter(self, line):
+        """
+        Reject a line that cannot give a TF - regulated pair without running the regex.
+
+        The line is split once into tokens and they are looked up in the hashed
+        names, with legacy_spans only tokens with a delimiter on both sides can
+        be an entity.
+
+        :param line: str, sentence without the trailing newline
+        :return: str, "no_tf" or "no_regulated" when the line is rejected, None otherwise
+        """
+        if not self.use_prefilter:
+            return None
+        line = self.dictionary.key(line)
+        tokens = line.split(" ") if self.split is None else self.split(line)
+        if self.legacy_spans:
+            tokens = tokens[1:-1]
+        if self.tf_tokens.isdisjoint(tokens):
+            return "no_tf"
+        if self.regulated_tokens.isdisjoint(tokens):
+            return "no_regulated"
+        return None
+
+    def scan(self, line):
+        """
+        :param line: str, sentence without the trailing newline
+        :return: generator of (start, end, key) of every surface form found
+        """
+        if self.legacy_spans:
+            for match in self.pattern.finditer(line):
+                yield match.start(), match.end(), self.dictionary.key(match.group())
+            return
+        for match in self.pattern.finditer(line):
+            start = match.start()
+            key = self.dictionary.key(match.group(1))
+            for length in self.prefixes.get(key, ()):
+                yield start, start + length, key[:length]
+            yield start, match.end(1), key
+
+    def find_entities(self, line):
+        """
+        Get the TF and regulated hits of a line with their canonical names.
+
+        :param line: str, sentence without the trailing newline
+        :return: tuple, (hits_tf, hits_regulated) as lists of ([start, end], canonical name)
+        """
+        # (kind, index in list) -> (start, end) of the hits
+        hits = {}
+        for start, end, form in self.scan(line):
+            for key in self.entries[form]:
+                hits.setdefault(key, []).append((start, end))
+        found = {TF: [], REGULATED: []}
+        for (kind, idx) in sorted(hits):
+            name = self.dictionary.canonical(kind, idx)
+            last_end = -1
+            for start, end in hits[(kind, idx)]:
+                span = [start - self.margin, end + self.margin]
+                # The legacy pattern consumed the surrounding spaces
+                if self.legacy_spans and span[0] < last_end:
+                    continue
+                found[kind].append((span, name))
+                last_end = span[1]
+        return found[TF], found[REGULATED]
+
+    def find(self, line):
+        """
+        Get the TF and regulated spans of a line.
+
+        :param line: str, sentence without the trailing newline
+        :return: tuple, (spans_tf, spans_regulated) as lists of [start, end]
+        """
+        hits_tf, hits_regulated = self.find_entities(line)
+        return [span for span, _ in hits_tf], [span for span, _ in hits_regulated]
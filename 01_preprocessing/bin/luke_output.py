@@ -0,0 +1,165 @@
+import json
+import pickle
+from array import array
+
+import pandas as pd
+
+LUKE_COLUMNS = ['sentence', 'entity_spans', 'regulator', 'regulated', 'file', 'line', 'pmid']
+
+
+class LukeRowBuffer:
+    """
+    Columnar buffer of candidate pairs.
+
+    Strings are kept in one list per column, the four span offsets of every
+    pair in a flat int32 array and the line numbers in another int32 array,
+    the DataFrame is built once with to_frame instead of growing it one cell
+    at a time.
+    """
+
+    def __init__(self):
+        self.sentence = []
+        self.regulator = []
+        self.regulated = []
+        self.file = []
+        self.line = array('i')
+        self.pmid = []
+        # start_tf, end_tf, start_regulated, end_regulated of every pair
+        self.spans = array('i')
+
+    def __len__(self):
+        return len(self.sentence)
+
+    def add(self, sentence, entity_spans, regulator, regulated, file, line, pmid=""):
+        """
+        :param sentence: str, the sentence of the pair
+        :param entity_spans: list, [[start_tf, end_tf], [start_regulated, end_regulated]]
+        :param regulator: str, text of the TF span
+        :param regulated: str, text of the regulated span
+        :param file: str, article the sentence comes from
+        :param line: int, line number of the sentence in the article (starting at 1)
+        :param pmid: str, PMID of the article, empty if it is not known
+        """
+        self.sentence.append(sentence)
+        self.regulator.append(regulator)
+        self.regulated.append(regulated)
+        self.file.append(file)
+        self.line.append(line)
+        self.pmid.append(pmid)
+        self.spans.extend((entity_spans[0][0], entity_spans[0][1], entity_spans[1][0], entity_spans[1][1]))
+
+    def extend(self, rows):
+        """Add (sentence, entity_spans, regulator, regulated, file, line, pmid) rows."""
+        for row in rows:
+            self.add(*row)
+
+    def to_frame(self, start_index=0):
+        """
+        Build the DataFrame of the buffered pairs.
+
+        :param start_index: int, index label of the first row
+        :return: pandas DataFrame with the LUKE_COLUMNS
+        """
+        spans = self.spans
+        entity_spans = [[[spans[i], spans[i + 1]], [spans[i + 2], spans[i + 3]]] for i in range(0, len(spans), 4)]
+        index = pd.RangeIndex(start_index, start_index + len(self))
+        return pd.DataFrame({'sentence': pd.Series(self.sentence, index=index, dtype=object),
+                             'entity_spans': pd.Series(entity_spans, index=index, dtype=object),
+                             'regulator': pd.Series(self.regulator, index=index, dtype=object),
+                             'regulated': pd.Series(self.regulated, index=index, dtype=object),
+                             'file': pd.Series(self.file, index=index, dtype=object),
+                             'line': pd.Series(self.line, index=index, dtype='int64'),
+                             'pmid': pd.Series(self.pmid, index=index, dtype=object)},
+                            columns=LUKE_COLUMNS)
+
+    def clear(self):
+        self.__init__()
+
+
+class StreamingTSVWriter:
+    """
+    Append-only TSV writer for the rows of the LUKE dataset.
+
+    Rows are buffered per finished article and appended to the TSV once the
+    buffer reaches ``chunk_rows``, so the file is written once instead of
+    being rewritten after every article, and it always holds whole articles.
+    """
+
+    def __init__(self, output_path, chunk_rows=10000, manifest=None):
+        """
+        :param output_path: str, path of the TSV file, it is overwritten
+        :param chunk_rows: int, rows kept in memory before appending them
+        :param manifest: ManifestWriter, gets the records of the articles of every flushed chunk
+        """
+        self.output_path = output_path
+        self.chunk_rows = chunk_rows
+        self.manifest = manifest
+        self.buffer = LukeRowBuffer()
+        self.records = []
+        self.written_rows = 0
+        # Only the header, rows are appended by flush
+        pd.DataFrame(columns=LUKE_COLUMNS).to_csv(self.output_path, index=False, sep="\t")
+
+    def write_rows(self, rows, record=None):
+        """
+        Add the rows of a finished article.
+
+        :param rows: list, (sentence, entity_spans, regulator, regulated, file, line, pmid) rows
+        :param record: dict, manifest record of the article
+        """
+        self.buffer.extend(rows)
+        if record is not None:
+            self.records.append(record)
+        if len(self.buffer) >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        """Append the buffered rows to the TSV, then their articles to the manifest."""
+        if len(self.buffer) > 0:
+            # The DataFrame is built once per chunk
+            chunk = self.buffer.to_frame(self.written_rows)
+            chunk.to_csv(self.output_path, mode="a", header=False, index=False, sep="\t")
+            self.written_rows += len(chunk)
+            self.buffer.clear()
+        if self.manifest is not None:
+            self.manifest.append(self.records)
+        self.records = []
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def read_luke_tsv(tsv_path):
+    """
+    Read a TSV written by StreamingTSVWriter back into the LUKE DataFrame.
+
+    Strings are kept verbatim (regulator and regulated include the surrounding
+    spaces) and entity_spans are parsed back to lists of [start, end].
+
+    :param tsv_path: str, path of the TSV file
+    :return: pandas DataFrame with the LUKE_COLUMNS
+    """
+    df = pd.read_csv(tsv_path, sep="\t", dtype=str, keep_default_na=False, na_filter=False).astype(object)
+    df['entity_spans'] = [json.loads(x) for x in df['entity_spans']]
+    df['line'] = df['line'].astype('int64')
+    return df
+
+
+def tsv_to_pickle(tsv_path, pkl_path):
+    """
+    Write the pickle (protocol 4) of the dataset from the streamed TSV.
+
+    Only the DataFrame read from the TSV is held in memory.
+
+    :param tsv_path: str, path of the TSV written by StreamingTSVWriter
+    :param pkl_path: str, path of the output pickle
+    """
+    df = read_luke_tsv(tsv_path)
+    with open(pkl_path, "wb") as f:
+        pickle.dump(df, f, protocol=4)
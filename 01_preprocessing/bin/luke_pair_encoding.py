@@ -0,0 +1,171 @@
+"""
+LUKE entity pair inputs with each sentence tokenized once.
+
+LukeTokenizer (task="entity_pair_classification") cuts the sentence of
+every pair at the starts and ends of its two spans, tokenizes every piece
+on its own, puts <ent> / <ent2> around the entities and computes the
+entity_position_ids from the token positions of the cuts. A sentence with
+many candidate pairs (most of the sentences of the articles) is therefore
+tokenized again for every pair.
+
+LukePairEncoder splits a sentence once into the pre-tokens of the
+tokenizer (its regular expression, the byte-level BPE works on each
+pre-token alone) and keeps the token ids of every pre-token and the token
+position of every pre-token boundary. A piece between two boundaries has
+the token ids of its pre-tokens, so the pieces of every pair are slices of
+the ids of the sentence; a cut inside a pre-token (a span ending inside a
+word) tokenizes that piece with the tokenizer, as LukeTokenizer does. The
+rest (special tokens, truncation, entity_position_ids, padding) is done by
+LukeTokenizer.prepare_for_model and pad, so the output is the same as
+calling the tokenizer on the pairs (benchmark_luke_pair_encoding.py checks it).
+"""
+import itertools
+
+from transformers import BatchEncoding
+
+
+class LukePairEncoder:
+    """
+    Callable as a LukeTokenizer of task "entity_pair_classification":
+    ``encoder(sentences, entity_spans=spans, padding=..., truncation=True, max_length=...)``.
+
+    The pre-tokens of the last cache_size sentences are kept, the pairs of
+    a sentence are usually in consecutive rows (LukePairs, UniquePairs).
+    """
+
+    def __init__(self, tokenizer, cache_size=10000):
+        """
+        :param tokenizer: LukeTokenizer with task="entity_pair_classification" (load_tokenizer)
+        :param cache_size: int, sentences whose pre-tokens are kept
+        """
+        if tokenizer.task != "entity_pair_classification":
+            raise ValueError("LukePairEncoder needs a tokenizer of task entity_pair_classification, got {}".format(
+                tokenizer.task))
+        self.tokenizer = tokenizer
+        self.model_max_length = tokenizer.model_max_length
+        self.cache_size = cache_size
+        self.sentences = {}
+        # Pieces of a sentence are only the slices of its ids without the prefix space and the added tokens (<mask>,
+        # <ent>, ...) that the tokenizer splits on
+        self.fast = not tokenizer.add_prefix_space
+        self.added_tokens = list(tokenizer.added_tokens_encoder)
+        self.stats = {"sentences": 0, "pairs": 0, "pieces": 0, "tokenized_pieces": 0}
+
+    def __repr__(self):
+        return "LukePairEncoder({}, {} sentences cached)".format(self.tokenizer.name_or_path, len(self.sentences))
+
+    def token_ids(self, text):
+        """
+        :param text: str, piece of a sentence
+        :return: list of int, ids of the piece as LukeTokenizer gives them
+        """
+        return self.tokenizer.convert_tokens_to_ids(self.tokenizer.tokenize(text))
+
+    def sentence_pieces(self, sentence):
+        """
+        :param sentence: str
+        :return: tuple, (ids of the sentence, dict char position of a pre-token boundary -> token position), None if
+            the sentence cannot be sliced
+        """
+        if sentence in self.sentences:
+            return self.sentences[sentence]
+        pieces = None
+        if self.fast and not any(token in sentence for token in self.added_tokens):
+            ids = []
+            positions = {0: 0}
+            end = 0
+            for match in self.tokenizer.pat.finditer(sentence):
+                if match.start() != end:
+                    # Characters outside of every pre-token, the pieces are tokenized with the tokenizer
+                    break
+                ids.extend(self.token_ids(match.group()))
+                end = match.end()
+                positions[end] = len(ids)
+            else:
+                if end == len(sentence):
+                    pieces = (ids, positions)
+        if len(self.sentences) >= self.cache_size:
+            self.sentences.clear()
+        self.sentences[sentence] = pieces
+        self.stats["sentences"] += 1
+        return pieces
+
+    def piece_ids(self, sentence, pieces, start, end):
+        """
+        :return: list of int, ids of sentence[start:end], a slice of the ids of the sentence if both ends are
+            pre-token boundaries
+        """
+        self.stats["pieces"] += 1
+        if pieces is not None and start in pieces[1] and end in pieces[1]:
+            return pieces[0][pieces[1][start]:pieces[1][end]]
+        self.stats["tokenized_pieces"] += 1
+        return self.token_ids(sentence[start:end])
+
+    def pair_sequence(self, sentence, entity_spans):
+        """
+        Input ids with the entity markers, entity ids and entity token spans of a pair, as
+        LukeTokenizer._create_input_sequence for entity_pair_classification.
+
+        :param sentence: str, sentence of the pair
+        :param entity_spans: [(start_tf, end_tf), (start_regulated, end_regulated)]
+        :return: tuple, (input_ids, entity_ids, entity_token_spans)
+        """
+        tokenizer = self.tokenizer
+        entity_spans = [(int(start), int(end)) for start, end in entity_spans]
+        pieces = self.sentence_pieces(sentence)
+        cur = 0
+        input_ids = []
+        char_to_token = {}
+        for position in sorted(frozenset(itertools.chain(*entity_spans))):
+            split = position
+            # The whitespace before a cut goes with the next piece
+            if split > 0 and sentence[split - 1] == " ":
+                split -= 1
+            if cur != split:
+                input_ids += self.piece_ids(sentence, pieces, cur, split)
+                cur = split
+            char_to_token[position] = len(input_ids)
+        input_ids += self.piece_ids(sentence, pieces, cur, len(sentence))
+        self.stats["pairs"] += 1
+
+        head_span, tail_span = [(char_to_token[start], char_to_token[end]) for start, end in entity_spans]
+        entity_ids = [tokenizer.entity_mask_token_id, tokenizer.entity_mask2_token_id]
+        markers = [(head_span, tokenizer.additional_special_tokens_ids[0]),
+                   (tail_span, tokenizer.additional_special_tokens_ids[1])]
+        # Markers are inserted from the last entity to the first, the spans move by the markers before them
+        if head_span[0] < tail_span[0]:
+            entity_token_spans = [(head_span[0], head_span[1] + 2), (tail_span[0] + 2, tail_span[1] + 4)]
+            markers = reversed(markers)
+        else:
+            entity_token_spans = [(head_span[0] + 2, head_span[1] + 4), (tail_span[0], tail_span[1] + 2)]
+        for (start, end), marker in markers:
+            input_ids = input_ids[:end] + [marker] + input_ids[end:]
+            input_ids = input_ids[:start] + [marker] + input_ids[start:]
+        return input_ids, entity_ids, entity_token_spans
+
+    def __call__(self, sentences, entity_spans, padding=False, truncation=None, max_length=None, return_tensors=None):
+        """
+        :param sentences: list of str, sentence of every pair
+        :param entity_spans: list of [(start_tf, end_tf), (start_regulated, end_regulated)]
+        :param padding: bool or str, as for the tokenizer (True, "max_length")
+        :param truncation: bool or str, as for the tokenizer
+        :param max_length: int, None for the model maximum
+        :param return_tensors: str, "np", "pt" or None for lists
+        :return: BatchEncoding, input_ids, attention_mask, entity_ids, entity_position_ids, entity_attention_mask
+        """
+        tokenizer = self.tokenizer
+        if max_length is None and (truncation or padding == "max_length"):
+            max_length = tokenizer.model_max_length
+        batch = {}
+        for sentence, spans in zip(sentences, entity_spans):
+            input_ids, entity_ids, entity_token_spans = self.pair_sequence(sentence, spans)
+            # Padding afterwards for the whole batch, as the tokenizer does
+            outputs = tokenizer.prepare_for_model(input_ids, entity_ids=entity_ids,
+                                                  entity_token_spans=entity_token_spans, padding=False,
+                                                  truncation=truncation, max_length=max_length,
+                                                  return_attention_mask=False)
+            for key, value in outputs.items():
+                batch.setdefault(key, []).append(value)
+        # max_length only applies to padding="max_length", as in the tokenizer
+        batch = tokenizer.pad(batch, padding=padding, max_length=max_length if padding == "max_length" else None)
+        return BatchEncoding(batch, tensor_type=return_tensors)
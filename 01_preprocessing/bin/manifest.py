@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+
+from entity_dictionary import VERBATIM
+from entity_matcher import EntityMatcher
+from luke_output import LUKE_COLUMNS, read_luke_tsv
+from pair_pruning import NO_PRUNING
+
+
+def file_sha256(path, block_size=1 << 20):
+    """
+    :param path: str, path of the file
+    :param block_size: int, bytes read at a time
+    :return: str, hexadecimal SHA-256 of the content
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def entity_lists_hash(tfs, regulated):
+    """
+    :param tfs: list, transcription factor names
+    :param regulated: list, regulated gene names
+    :return: str, hexadecimal SHA-256 of both lists
+    """
+    content = json.dumps({"tfs": list(tfs), "regulated": list(regulated)}, sort_keys=True)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def article_record(path, result):
+    """
+    Manifest entry of a processed article.
+
+    :param path: str, path of the article
+    :param result: ArticleResult of the article
+    :return: dict with file, size, mtime, sha256, rows and the entities found
+    """
+    stat = os.stat(path)
+    return {"file": result.file, "size": stat.st_size, "mtime": stat.st_mtime,
+            "sha256": file_sha256(path), "rows": len(result.rows), "entities": result.entities}
+
+
+class ManifestWriter:
+    """
+    Append-only manifest of the articles whose rows are already in the output.
+
+    The file is JSON lines: a header with the entity lists and the dictionary, pruning and sentence
+    splitting settings used and then one
+    record per article, in the order of the rows of the output TSV. Records
+    are appended only after the rows of the article are flushed, so after an
+    interrupted run the manifest still describes the output exactly.
+    """
+
+    def __init__(self, manifest_path, tfs, regulated, pruning=NO_PRUNING, rules=VERBATIM, split_sentences=False):
+        """
+        :param manifest_path: str, path of the manifest, it is overwritten
+        :param tfs: list, transcription factor names
+        :param regulated: list, regulated gene names
+        :param pruning: PairPruning, rules applied to the candidate pairs
+        :param rules: DictionaryRules, aliases and normalization rules of the entity dictionary
+        :param split_sentences: bool, the lines of the articles were split into sentences
+        """
+        self.manifest_path = manifest_path
+        header = {"entity_lists_hash": entity_lists_hash(tfs, regulated),
+                  "tfs": list(tfs), "regulated": list(regulated), "pruning": pruning._asdict(),
+                  "dictionary": rules._asdict(),
+                  "split_sentences": split_sentences, "columns": LUKE_COLUMNS}
+        with open(self.manifest_path, "w") as f:
+            f.write(json.dumps(header) + "\n")
+
+    def append(self, records):
+        """
+        :param records: list, article records whose rows were just flushed
+        """
+        if not records:
+            return
+        with open(self.manifest_path, "a") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+
+
+def read_manifest(manifest_path):
+    """
+    :param manifest_path: str, path of the manifest
+    :return: tuple, (header, list of article records) or (None, []) if there is no manifest
+    """
+    if not os.path.exists(manifest_path):
+        return None, []
+    with open(manifest_path) as f:
+        lines = [json.loads(line) for line in f if line.strip()]
+    if not lines:
+        return None, []
+    return lines[0], lines[1:]
+
+
+def plan_incremental_run(paths, header, records, tfs, regulated, pruning=NO_PRUNING, rules=VERBATIM,
+                         split_sentences=False):
+    """
+    Decide which articles have to be processed again.
+
+    An article is reused when it is in the manifest with the same size and
+    mtime, or with the same content hash. When the entity lists changed, only
+    the reused articles that contain a removed name (from the entities of the
+    record) or an added name (found with a matcher of the added names only)
+    are invalidated. Changed pruning, dictionary or sentence splitting settings, or other output
+    columns, invalidate every article.
+
+    :param paths: list, paths of the articles of this run
+    :param header: dict, header of the previous manifest or None
+    :param records: list, article records of the previous manifest
+    :param tfs: list, transcription factor names of this run
+    :param regulated: list, regulated gene names of this run
+    :param pruning: PairPruning, rules applied to the candidate pairs of this run
+    :param rules: DictionaryRules, aliases and normalization rules of this run
+    :param split_sentences: bool, the lines of the articles are split into sentences in this run
+    :return: tuple, (dict file name -> reused record, list of paths to process)
+    """
+    # Manifests written before the pruning and dictionary rules searched the names verbatim without pruning
+    if header is None or header.get("pruning", NO_PRUNING._asdict()) != pruning._asdict() \
+            or header.get("dictionary", VERBATIM._asdict()) != rules._asdict() \
+            or header.get("split_sentences", False) != split_sentences \
+            or header.get("columns") != LUKE_COLUMNS:
+        return {}, list(paths)
+    previous = {record["file"]: record for record in records}
+    reused = {}
+    for path in paths:
+        record = previous.get(os.path.basename(path))
+        if record is None:
+            continue
+        stat = os.stat(path)
+        if (stat.st_size, stat.st_mtime) == (record["size"], record["mtime"]) \
+                or (stat.st_size == record["size"] and file_sha256(path) == record["sha256"]):
+            reused[record["file"]] = dict(record, mtime=stat.st_mtime)
+
+    if header["entity_lists_hash"] != entity_lists_hash(tfs, regulated):
+        removed = {"tfs": set(header["tfs"]) - set(tfs),
+                   "regulated": set(header["regulated"]) - set(regulated)}
+        added_tfs = sorted(set(tfs) - set(header["tfs"]))
+        added_regulated = sorted(set(regulated) - set(header["regulated"]))
+        added_matcher = EntityMatcher(added_tfs, added_regulated, rules) if added_tfs or added_regulated else None
+        for path in paths:
+            record = reused.get(os.path.basename(path))
+            if record is None:
+                continue
+            invalid = any(removed[kind].intersection(record["entities"][kind]) for kind in removed)
+            if not invalid and added_matcher is not None:
+                with open(path, mode="r") as ifile:
+                    invalid = any(added_matcher.pattern.search(line.rstrip("\n")) for line in ifile)
+            if invalid:
+                del reused[record["file"]]
+    to_process = [path for path in paths if os.path.basename(path) not in reused]
+    return reused, to_process
+
+
+def read_previous_rows(tsv_path, records, reused):
+    """
+    Get the rows of the reused articles from the previous output.
+
+    Rows of the output are in the order of the manifest records, rows after
+    the last record (flushed by an interrupted run) are ignored.
+
+    :param tsv_path: str, path of the previous output TSV
+    :param records: list, article records of the previous manifest
+    :param reused: dict, file name -> record of the reused articles
+    :return: dict, file name -> list of rows with the LUKE_COLUMNS
+    """
+    if not reused:
+        return {}
+    df = read_luke_tsv(tsv_path)
+    if len(df) < sum(record["rows"] for record in records):
+        raise ValueError("{} has fewer rows than its manifest".format(tsv_path))
+    rows = {}
+    start = 0
+    for record in records:
+        end = start + record["rows"]
+        if record["file"] in reused:
+            rows[record["file"]] = list(zip(*(df[col][start:end] for col in LUKE_COLUMNS)))
+        start = end
+    return rows
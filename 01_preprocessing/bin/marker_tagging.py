@@ -0,0 +1,111 @@
+"""
+Marker-tagged sentences of the candidate pairs, the input of the BERT-family models.
+
+The sequence classification scripts (bert_v1, biobert_v2, biolinkbert_v2,
+biomegatron_v1, bioroberta_v1) are trained on the sentence_tagged column of
+the curated E. coli dataset, where the TF of the pair is replaced by @TF$
+and the regulated gene by @Regulated$. The preprocessing of new corpora
+keeps spans only, so the tagged sentence of a pair is built from the
+sentence and its spans when the BERT scripts load the pairs: one at a time
+with TaggedPairs (``data.iloc[idx]`` as for RelationExtractionDataset) or in
+batches with iter_tagged_batches, without a tagged copy of the sentence of
+every pair in memory or on disk.
+"""
+from collections import namedtuple
+
+from ecoli_spans import REGULATED_TAG, TF_TAG
+
+# Row of a tagged pair, sentence is the tagged sentence as the BERT scripts read it
+TaggedPair = namedtuple("TaggedPair", ["sentence", "entity_spans", "regulator", "regulated"])
+
+
+def entity_bounds(sentence, span):
+    """
+    :param sentence: str, sentence of the pair
+    :param span: list, [start, end] of the entity, with or without the surrounding spaces (legacy_spans)
+    :return: tuple, (start, end) of the entity name without the surrounding whitespace
+    """
+    start, end = span
+    while start < end and sentence[start].isspace():
+        start += 1
+    while end > start and sentence[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def tag_sentence(sentence, entity_spans):
+    """
+    Replace the TF and the regulated gene of a pair by @TF$ and @Regulated$.
+
+    Only the occurrence at the span is replaced, other mentions of the same
+    names stay as they are, as in sentence_tagged of the curated dataset. If
+    both spans overlap (a name in both lists paired with itself, see
+    exclude_self_pairs of pair_pruning.py) they are replaced together by
+    "@TF$ @Regulated$".
+
+    :param sentence: str, sentence of the pair
+    :param entity_spans: list, [[start_tf, end_tf], [start_regulated, end_regulated]]
+    :return: str, tagged sentence
+    """
+    start_tf, end_tf = entity_bounds(sentence, entity_spans[0])
+    start_regulated, end_regulated = entity_bounds(sentence, entity_spans[1])
+    if start_tf < end_regulated and start_regulated < end_tf:
+        start, end = min(start_tf, start_regulated), max(end_tf, end_regulated)
+        return sentence[:start] + TF_TAG + " " + REGULATED_TAG + sentence[end:]
+    if start_tf < start_regulated:
+        return (sentence[:start_tf] + TF_TAG + sentence[end_tf:start_regulated] + REGULATED_TAG +
+                sentence[end_regulated:])
+    return (sentence[:start_regulated] + REGULATED_TAG + sentence[end_regulated:start_tf] + TF_TAG +
+            sentence[end_tf:])
+
+
+class TaggedPairs:
+    """
+    Tagged sentences of the pairs of a LukePairs, UniquePairs or LUKE DataFrame.
+
+    ``data.iloc[idx]`` tags the sentence of pair idx on access, so the
+    tagged dataset is as large as the one it wraps. item.sentence is the
+    tagged sentence, as the BERT scripts read it.
+    """
+
+    def __init__(self, pairs):
+        """
+        :param pairs: LukePairs, UniquePairs or DataFrame with the sentence and entity_spans columns
+        """
+        self.pairs = pairs
+        self.iloc = self
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def __repr__(self):
+        return "TaggedPairs({!r})".format(self.pairs)
+
+    def __getitem__(self, idx):
+        item = self.pairs.iloc[idx]
+        return TaggedPair(tag_sentence(item.sentence, item.entity_spans), item.entity_spans,
+                          item.regulator, item.regulated)
+
+
+def iter_tagged_batches(pairs, batch_size=1024):
+    """
+    :param pairs: LukePairs, UniquePairs or DataFrame with the sentence and entity_spans columns
+    :param batch_size: int, pairs per batch
+    :return: generator of lists of str, tagged sentences of batch_size consecutive pairs
+    """
+    tagged = TaggedPairs(pairs)
+    for start in range(0, len(tagged), batch_size):
+        yield [tagged[idx].sentence for idx in range(start, min(start + batch_size, len(tagged)))]
+
+
+def count_taggable(pairs):
+    """
+    :param pairs: LukePairs, UniquePairs or DataFrame with the sentence and entity_spans columns
+    :return: int, pairs whose TF and regulated gene spans are not empty once stripped, the ones tag_sentence tags
+    """
+    taggable = 0
+    for idx in range(len(pairs)):
+        item = pairs.iloc[idx]
+        taggable += all(start < end for start, end in (entity_bounds(item.sentence, span)
+                                                       for span in item.entity_spans))
+    return taggable
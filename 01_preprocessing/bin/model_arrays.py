@@ -0,0 +1,134 @@
+"""
+Model-ready LUKE inputs written once by the preprocessing.
+
+The modelling scripts call LukeTokenizer in RelationExtractionDataset.__getitem__
+on every access (every epoch, every inference run). write_model_arrays
+tokenizes the pairs in batches for a named tokenizer and max length and
+stores every input as a .npy file next to the row metadata; ModelArrays
+memory-maps them so __getitem__ only slices arrays. The sentences of the
+sequence classification models (no entity spans) are written the same way
+by the tokenization cache of the modelling scripts (tokenization_cache.py).
+"""
+import json
+import os
+
+import numpy as np
+
+MODEL_ARRAYS_META = "model_arrays.json"
+# Directory of the arrays of the unique pairs inside the normalized dataset
+MODEL_ARRAYS_DIR = "model_arrays"
+# Longest padded length of the arrays; a tokenizer loaded without model_max_length (AutoTokenizer of a hub name
+# without it in its tokenizer_config.json) has int(1e30), which would pad every row to an impossible shape
+MAX_PADDED_LENGTH = 100000
+
+
+def load_tokenizer(tokenizer_name):
+    """
+    :param tokenizer_name: str, e.g. "studio-ousia/luke-base"
+    :return: LukeTokenizer for entity pair classification, as in the modelling scripts
+    """
+    # Only needed when the arrays are written, the rest of the preprocessing does not depend on transformers
+    from transformers import LukeTokenizer
+    return LukeTokenizer.from_pretrained(tokenizer_name, task="entity_pair_classification")
+
+
+def padded_length(tokenizer, max_length=None):
+    """
+    :param tokenizer: tokenizer of the model
+    :param max_length: int, padded and truncated length, None for the model maximum
+    :return: int, max_length or the model_max_length of the tokenizer
+    """
+    max_length = max_length or tokenizer.model_max_length
+    if max_length > MAX_PADDED_LENGTH:
+        name = tokenizer.name_or_path or type(tokenizer).__name__
+        raise ValueError("{} has no model_max_length (got {}), give max_length (e.g. 512) or load the tokenizer "
+                         "with model_max_length".format(name, max_length))
+    return int(max_length)
+
+
+def write_model_arrays(arrays_dir, sentences, entity_spans, tokenizer_name, max_length=None, batch_size=1024,
+                       tokenizer=None):
+    """
+    Tokenize every pair and write its model inputs as memory-mappable int32 arrays.
+
+    Row i of every array is pair i of sentences / entity_spans, so the
+    arrays follow the order of the row metadata they were built from.
+    Every input the tokenizer gives (input_ids, attention_mask, entity_ids,
+    entity_position_ids and entity_attention_mask for LUKE) gets its .npy file.
+
+    :param arrays_dir: str, output directory (input_ids.npy, ..., model_arrays.json)
+    :param sentences: list of str, sentence of every pair
+    :param entity_spans: list of [[start_tf, end_tf], [start_regulated, end_regulated]], None for the sentence
+        classification tokenizers
+    :param tokenizer_name: str, name or path given to LukeTokenizer.from_pretrained
+    :param max_length: int, padded and truncated length, None for the model maximum (as padding="max_length")
+    :param batch_size: int, pairs tokenized per call
+    :param tokenizer: tokenizer already loaded, None loads the LukeTokenizer of tokenizer_name
+    :return: dict, metadata written to model_arrays.json
+    """
+    if tokenizer is None:
+        tokenizer = load_tokenizer(tokenizer_name)
+    encode = tokenizer
+    if entity_spans is not None and getattr(tokenizer, "task", None) == "entity_pair_classification":
+        # Same arrays as the tokenizer, the sentence of several pairs is tokenized once
+        from luke_pair_encoding import LukePairEncoder
+        encode = LukePairEncoder(tokenizer)
+    max_length = padded_length(tokenizer, max_length)
+    os.makedirs(arrays_dir, exist_ok=True)
+    arrays = {}
+    for start in range(0, len(sentences), batch_size):
+        kwargs = {}
+        if entity_spans is not None:
+            kwargs["entity_spans"] = [[tuple(span) for span in spans]
+                                      for spans in entity_spans[start:start + batch_size]]
+        encoding = encode(list(sentences[start:start + batch_size]), padding="max_length", truncation=True,
+                          max_length=max_length, return_tensors="np", **kwargs)
+        for name in encoding.keys():
+            values = encoding[name]
+            if name not in arrays:
+                arrays[name] = np.lib.format.open_memmap(os.path.join(arrays_dir, name + ".npy"), mode="w+",
+                                                         dtype=np.int32, shape=(len(sentences),) + values.shape[1:])
+            arrays[name][start:start + len(values)] = values
+    for array in arrays.values():
+        array.flush()
+    meta = {"tokenizer": tokenizer_name, "max_length": int(max_length), "rows": len(sentences),
+            "shapes": {name: list(array.shape[1:]) for name, array in arrays.items()}}
+    with open(os.path.join(arrays_dir, MODEL_ARRAYS_META), "w") as f:
+        json.dump(meta, f, indent=1)
+    return meta
+
+
+class ModelArrays:
+    """
+    Memory-mapped model inputs written by write_model_arrays.
+
+    ``arrays[idx]`` gives the encoding of pair idx as the tokenizer did
+    (int64, without the batch dimension).
+    """
+
+    def __init__(self, arrays_dir, tokenizer_name=None, max_length=None):
+        """
+        :param arrays_dir: str, directory written by write_model_arrays
+        :param tokenizer_name: str, tokenizer the model expects, None to skip the check
+        :param max_length: int, length the model expects, None to skip the check
+        """
+        with open(os.path.join(arrays_dir, MODEL_ARRAYS_META)) as f:
+            self.meta = json.load(f)
+        if tokenizer_name is not None and self.meta["tokenizer"] != tokenizer_name:
+            raise ValueError("Arrays of {} were written with tokenizer {}, expected {}".format(
+                arrays_dir, self.meta["tokenizer"], tokenizer_name))
+        if max_length is not None and self.meta["max_length"] != max_length:
+            raise ValueError("Arrays of {} have max_length {}, expected {}".format(
+                arrays_dir, self.meta["max_length"], max_length))
+        self.arrays = {name: np.load(os.path.join(arrays_dir, name + ".npy"), mmap_mode="r")
+                       for name in self.meta["shapes"]}
+
+    def __len__(self):
+        return self.meta["rows"]
+
+    def __repr__(self):
+        return "ModelArrays({} rows, {}, max_length {})".format(len(self), self.meta["tokenizer"],
+                                                              self.meta["max_length"])
+
+    def __getitem__(self, idx):
+        return {name: np.asarray(array[idx], dtype=np.int64) for name, array in self.arrays.items()}
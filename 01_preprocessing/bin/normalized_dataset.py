@@ -0,0 +1,106 @@
+import json
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+SENTENCES_FILE = "sentences.tsv"
+PAIRS_FILE = "pairs.npy"
+SENTENCE_COLUMNS = ['sentence_id', 'file', 'line', 'pmid', 'sentence']
+
+# Row of the expanded dataset, same attributes RelationExtractionDataset reads from data.iloc[idx]
+LukePair = namedtuple("LukePair", ["sentence", "entity_spans", "regulator", "regulated", "file", "line", "pmid"])
+
+
+def write_normalized(tsv_path, output_dir, chunksize=100000):
+    """
+    Write the normalized form of a LUKE TSV written by StreamingTSVWriter.
+
+    - sentences.tsv: one row per sentence with candidate pairs
+      (sentence_id, file, line, pmid, sentence).
+    - pairs.npy: int32 array (n_pairs, 5) with sentence_id, start_tf, end_tf,
+      start_regulated, end_regulated.
+
+    The TSV is read in chunks, rows of the same (file, line) are contiguous in
+    it and share one sentence_id.
+
+    :param tsv_path: str, path of the LUKE TSV
+    :param output_dir: str, directory of the normalized dataset
+    :param chunksize: int, rows of the TSV read at a time
+    :return: tuple, (n_sentences, n_pairs)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    sentences_path = os.path.join(output_dir, SENTENCES_FILE)
+    raw_pairs_path = os.path.join(output_dir, PAIRS_FILE + ".tmp")
+    pd.DataFrame(columns=SENTENCE_COLUMNS).to_csv(sentences_path, index=False, sep="\t")
+    last_key = None
+    sentence_id = -1
+    n_pairs = 0
+    with open(raw_pairs_path, "wb") as raw_pairs:
+        chunks = pd.read_csv(tsv_path, sep="\t", dtype=str, keep_default_na=False, na_filter=False, chunksize=chunksize)
+        for chunk in chunks:
+            sentence_rows = []
+            pairs = np.empty((len(chunk), 5), dtype=np.int32)
+            for i, (sentence, entity_spans, file, line, pmid) in enumerate(
+                    zip(chunk['sentence'], chunk['entity_spans'], chunk['file'], chunk['line'], chunk['pmid'])):
+                if (file, line) != last_key:
+                    last_key = (file, line)
+                    sentence_id += 1
+                    sentence_rows.append((sentence_id, file, line, pmid, sentence))
+                spans = json.loads(entity_spans)
+                pairs[i] = (sentence_id, spans[0][0], spans[0][1], spans[1][0], spans[1][1])
+            pd.DataFrame(sentence_rows, columns=SENTENCE_COLUMNS).to_csv(
+                sentences_path, mode="a", header=False, index=False, sep="\t")
+            raw_pairs.write(pairs.tobytes())
+            n_pairs += len(chunk)
+    # The .npy is filled from the raw file without loading it whole
+    if n_pairs:
+        raw = np.memmap(raw_pairs_path, dtype=np.int32, mode="r", shape=(n_pairs, 5))
+        out = np.lib.format.open_memmap(os.path.join(output_dir, PAIRS_FILE), mode="w+", dtype=np.int32, shape=(n_pairs, 5))
+        for start in range(0, n_pairs, chunksize):
+            out[start:start + chunksize] = raw[start:start + chunksize]
+        out.flush()
+        del out, raw
+    else:
+        np.save(os.path.join(output_dir, PAIRS_FILE), np.empty((0, 5), dtype=np.int32))
+    os.remove(raw_pairs_path)
+    return sentence_id + 1, n_pairs
+
+
+class LukePairs:
+    """
+    Candidate pairs of a normalized dataset, expanded one row at a time.
+
+    Every sentence is held once and the pairs stay memory-mapped, the
+    (sentence, entity_spans, regulator, regulated) row of a pair is only
+    built when it is accessed. ``data.iloc[idx]`` and ``len(data)`` work as
+    with the DataFrame, so it can be given to RelationExtractionDataset.
+    """
+
+    def __init__(self, dataset_dir):
+        """
+        :param dataset_dir: str, directory written by write_normalized
+        """
+        sentences = pd.read_csv(os.path.join(dataset_dir, SENTENCES_FILE), sep="\t", dtype=str,
+                                keep_default_na=False, na_filter=False)
+        self.sentences = sentences['sentence'].tolist()
+        self.files = sentences['file'].tolist()
+        self.lines = sentences['line'].astype(np.int64).to_numpy()
+        self.pmids = sentences['pmid'].tolist()
+        self.pairs = np.load(os.path.join(dataset_dir, PAIRS_FILE), mmap_mode="r")
+        self.iloc = self
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def __repr__(self):
+        return "LukePairs({} sentences, {} pairs)".format(len(self.sentences), len(self.pairs))
+
+    def __getitem__(self, idx):
+        sentence_id, start_tf, end_tf, start_regulated, end_regulated = self.pairs[idx].tolist()
+        sentence = self.sentences[sentence_id]
+        return LukePair(sentence, [[start_tf, end_tf], [start_regulated, end_regulated]],
+                        sentence[start_tf:end_tf], sentence[start_regulated:end_regulated],
+                        self.files[sentence_id], int(self.lines[sentence_id]), self.pmids[sentence_id])
+
@@ -0,0 +1,134 @@
+import os
+from collections import namedtuple
+
+import pandas as pd
+
+from entity_dictionary import VERBATIM
+from entity_matcher import EntityMatcher
+
+# Entity lists of an organism, name is None for the single tf_list_path / regulated_list_path run
+Organism = namedtuple("Organism", ["name", "tfs", "regulated"])
+
+
+def read_entity_list(list_path):
+    """
+    :param list_path: str, TSV with the names in the column '0' (STM_tfs.tsv, STM_regulated.tsv)
+    :return: list of str, names
+    """
+    return list(pd.read_csv(list_path, sep="\t")['0'])
+
+
+def read_registry(registry_path):
+    """
+    Read the organisms of a registry TSV.
+
+    Columns: organism, tf_list, regulated_list. Relative list paths are
+    taken from the directory of the registry.
+
+    :param registry_path: str, path of the registry (e.g. datasets/organisms.tsv)
+    :return: list of Organism, in the order of the registry
+    """
+    df = pd.read_csv(registry_path, sep="\t", dtype=str, keep_default_na=False)
+    base = os.path.dirname(os.path.abspath(registry_path))
+    organisms = []
+    for name, tf_list, regulated_list in zip(df["organism"], df["tf_list"], df["regulated_list"]):
+        organisms.append(Organism(name, read_entity_list(os.path.join(base, tf_list)),
+                                  read_entity_list(os.path.join(base, regulated_list))))
+    if len({organism.name for organism in organisms}) != len(organisms):
+        raise ValueError("Repeated organism in {}".format(registry_path))
+    return organisms
+
+
+def organism_path(path, organism):
+    """
+    Output path of an organism: the name is added before the extensions ("x.tsv.manifest.jsonl" ->
+    "x_STM.tsv.manifest.jsonl"), or at the end of a directory.
+
+    :param path: str, output path of the script (file or directory)
+    :param organism: str, name of the organism, None keeps the path
+    :return: str, path of the output of the organism
+    """
+    if organism is None:
+        return path
+    directory, name = os.path.split(path)
+    stem, dot, extensions = name.partition(".")
+    return os.path.join(directory, "{}_{}{}{}".format(stem, organism, dot, extensions))
+
+
+class OrganismMatcher:
+    """
+    Entity lists of several organisms searched in one scan per line.
+
+    The names of every organism go into one EntityMatcher (one trie regex and
+    one token prefilter), a name shared by several organisms (most TFs of
+    E. coli and Salmonella) is stored once, so a line is scanned once however
+    many organisms there are. The hits are then split by organism and sorted
+    by the position of the name in the lists of that organism, so every
+    organism gets the same hits as an EntityMatcher built from its own lists
+    (with legacy_spans and other delimiters than the space, a longer name of
+    another organism, "Crp-cAMP", still hides the shorter one, "Crp").
+    """
+
+    def __init__(self, organisms, rules=VERBATIM):
+        """
+        :param organisms: list of Organism
+        :param rules: DictionaryRules, aliases and normalization rules, shared by every organism
+        """
+        self.organisms = [organism.name for organism in organisms]
+        tfs = []
+        regulated = []
+        # Organism -> (TF name -> positions in its list, regulated name -> positions in its list)
+        self.positions = {}
+        for organism in organisms:
+            positions = ({}, {})
+            for merged, names, index in ((tfs, organism.tfs, positions[0]),
+                                         (regulated, organism.regulated, positions[1])):
+                for idx, name in enumerate(str(x) for x in names):
+                    if name not in index:
+                        merged.append(name)
+                    index.setdefault(name, []).append(idx)
+            self.positions[organism.name] = positions
+        # Names already added by a previous organism are not repeated
+        tfs = list(dict.fromkeys(tfs))
+        regulated = list(dict.fromkeys(regulated))
+        self.matcher = EntityMatcher(tfs, regulated, rules)
+        self.margin = self.matcher.margin
+        self.delimiters = self.matcher.delimiters
+        # Organisms whose names are in the same order in the merged lists (always the first one without
+        # repeated names) only need their hits filtered, the others are sorted again
+        merged_positions = [{name: idx for idx, name in enumerate(merged)} for merged in (tfs, regulated)]
+        self.in_order = {}
+        for organism, positions in self.positions.items():
+            self.in_order[organism] = all(
+                all(len(idxs) == 1 for idxs in index.values()) and
+                [name for name, _ in sorted(index.items(), key=lambda item: item[1])] ==
+                sorted(index, key=merged.__getitem__)
+                for index, merged in zip(positions, merged_positions))
+
+    def prefilter(self, line):
+        """
+        :param line: str, sentence without the trailing newline
+        :return: str, "no_tf" or "no_regulated" when no organism can give a pair in the line, None otherwise
+        """
+        return self.matcher.prefilter(line)
+
+    def find_entities(self, line):
+        """
+        Get the TF and regulated hits of a line for every organism.
+
+        :param line: str, sentence without the trailing newline
+        :return: dict, organism -> (hits_tf, hits_regulated) as lists of ([start, end], canonical name)
+        """
+        hits = self.matcher.find_entities(line)
+        found = {}
+        for organism in self.organisms:
+            if self.in_order[organism]:
+                found[organism] = tuple([hit for hit in kind_hits if hit[1] in index]
+                                        for kind_hits, index in zip(hits, self.positions[organism]))
+                continue
+            found[organism] = tuple(
+                # Stable sort: the hits of a name keep their order in the line
+                [hit for _, _, hit in sorted((idx, order, hit) for order, hit in enumerate(kind_hits)
+                                             for idx in index.get(hit[1], ()))]
+                for kind_hits, index in zip(hits, self.positions[organism]))
+        return found
@@ -0,0 +1,89 @@
+import re
+from collections import namedtuple
+from functools import lru_cache
+from itertools import product
+
+# Pruning rules of the candidate pairs, None / False disables a rule
+#   exclude_self_pairs: drop pairs whose TF and regulated gene are the same name ignoring case (PhoP - phoP)
+#   max_char_distance: max characters between the end of one entity and the start of the other
+#   max_token_distance: max tokens between both entities
+#   max_pairs_per_sentence: keep only the closest pairs of a sentence
+PairPruning = namedtuple("PairPruning", ["exclude_self_pairs", "max_char_distance",
+                                         "max_token_distance", "max_pairs_per_sentence"])
+NO_PRUNING = PairPruning(False, None, None, None)
+
+
+@lru_cache(maxsize=None)
+def token_pattern(delimiters):
+    """
+    :param delimiters: str, delimiters of the matcher (DictionaryRules.delimiters)
+    :return: compiled regex of a token, a run of characters that are neither a delimiter nor whitespace
+    """
+    return re.compile("[^\\s" + re.escape(delimiters) + "]+")
+
+
+def pair_distance(line, span_tf, span_regulated, margin=0, delimiters=" "):
+    """
+    Distance between the two entities of a pair, without the surrounding delimiters of the spans.
+
+    :param line: str, sentence
+    :param span_tf: list, [start, end] of the TF
+    :param span_regulated: list, [start, end] of the regulated gene
+    :param margin: int, delimiter characters included at each side of the spans (EntityMatcher.margin)
+    :param delimiters: str, characters that separate the tokens besides whitespace (EntityMatcher.delimiters)
+    :return: tuple, (characters, tokens) between both entities, 0 if they overlap
+    """
+    first, second = sorted((span_tf, span_regulated))
+    gap_start, gap_end = first[1] - margin, second[0] + margin
+    if gap_end <= gap_start:
+        return 0, 0
+    # Adjacent entities are separated by delimiters and no token
+    return gap_end - gap_start, len(token_pattern(delimiters).findall(line, gap_start, gap_end))
+
+
+def candidate_pairs(line, spans_tf, spans_regulated, pruning=NO_PRUNING, counters=None, margin=0, delimiters=" "):
+    """
+    TF x regulated pairs of a line after the pruning rules.
+
+    Rules are applied in order (self pairs, character distance, token
+    distance, per-sentence cap) and every pair dropped is counted under the
+    rule that dropped it, so each rule shows how many LUKE inputs it saves.
+    The pairs kept stay in the order of ``product(spans_tf, spans_regulated)``.
+
+    :param line: str, sentence
+    :param spans_tf: list, [start, end] spans of the TFs
+    :param spans_regulated: list, [start, end] spans of the regulated genes
+    :param pruning: PairPruning, rules to apply
+    :param counters: Counter, pruned_self / pruned_char_distance / pruned_token_distance / pruned_cap
+    :param margin: int, delimiter characters included at each side of the spans (EntityMatcher.margin)
+    :param delimiters: str, characters that separate the tokens besides whitespace (EntityMatcher.delimiters)
+    :return: list, pairs as [span_tf, span_regulated]
+    """
+    pairs = [[list(span_tf), list(span_regulated)] for span_tf, span_regulated in product(spans_tf, spans_regulated)]
+    if pruning == NO_PRUNING:
+        return pairs
+    if counters is None:
+        counters = {}
+    kept = []
+    distances = []
+    for pair in pairs:
+        if pruning.exclude_self_pairs and line[pair[0][0] + margin:pair[0][1] - margin].casefold() \
+                == line[pair[1][0] + margin:pair[1][1] - margin].casefold():
+            counters["pruned_self"] = counters.get("pruned_self", 0) + 1
+            continue
+        chars, tokens = pair_distance(line, pair[0], pair[1], margin, delimiters)
+        if pruning.max_char_distance is not None and chars > pruning.max_char_distance:
+            counters["pruned_char_distance"] = counters.get("pruned_char_distance", 0) + 1
+            continue
+        if pruning.max_token_distance is not None and tokens > pruning.max_token_distance:
+            counters["pruned_token_distance"] = counters.get("pruned_token_distance", 0) + 1
+            continue
+        kept.append(pair)
+        distances.append(chars)
+    cap = pruning.max_pairs_per_sentence
+    if cap is not None and len(kept) > cap:
+        counters["pruned_cap"] = counters.get("pruned_cap", 0) + len(kept) - cap
+        # The closest pairs are kept, ties in the order of the product
+        closest = sorted(sorted(range(len(kept)), key=lambda i: distances[i])[:cap])
+        kept = [kept[i] for i in closest]
+    return kept
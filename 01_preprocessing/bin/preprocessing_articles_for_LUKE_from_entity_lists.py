@@ -1,12 +1,55 @@
 import os
+from contextlib import ExitStack
 import pandas as pd
-import re
-from itertools import product
-import pickle
+from article_processing import process_articles
+from pair_pruning import PairPruning
+from pubmed_xml import ingest_dumps, read_pmid_list
+from entity_dictionary import VARIANT_DELIMITERS, DictionaryRules, read_alias_table
+from organism_registry import Organism, organism_path, read_registry
+from run_summary import RunSummary
+from luke_output import StreamingTSVWriter, tsv_to_pickle
+from normalized_dataset import write_normalized
+from sentence_dedup import UniquePairs, write_deduplicated
+from model_arrays import MODEL_ARRAYS_DIR, write_model_arrays
+from marker_tagging import count_taggable
+from columnar_dataset import tsv_to_arrow
+from manifest import ManifestWriter, article_record, plan_incremental_run, read_manifest, read_previous_rows
 
 
-
-files = 0
+# Procesos para repartir los archivos, 1 procesa en serie
+n_workers = 1
+# Filas en memoria antes de agregarlas al TSV de salida
+chunk_rows = 10000
+# Reutilizar los archivos sin cambios de la corrida anterior (según el manifiesto)
+incremental = True
+# Dividir cada línea en oraciones (artículos de texto completo sin separar); False si el paso
+# externo ya dejó una oración por línea
+split_sentences = False
+# Imprimir cada entidad encontrada y cada combinación (lento en corpus grandes)
+verbose = False
+# Diccionario de entidades: tabla de alias (TSV con columnas alias y canonical, None sin alias),
+# ignorar mayúsculas (PhoP / phoP) y aceptar guiones, paréntesis, diagonales y puntuación alrededor
+# de los nombres ("ArcA-dependent", "(fnr)", "OmpR/EnvZ"); False busca los nombres tal cual entre espacios
+alias_table_path = None
+ignore_case = False
+variant_delimiters = False
+# Spans exactos de cada nombre, también entidades adyacentes y al inicio o fin de la línea;
+# True reproduce la búsqueda original ' (nombre) ' (spans con los espacios, pierde esos casos)
+legacy_spans = False
+# Poda de pares candidatos antes de LUKE, None o False desactiva la regla
+# (mismo nombre como TF y regulado, distancia máxima en caracteres o tokens, tope de pares por oración)
+pair_pruning = PairPruning(exclude_self_pairs=False, max_char_distance=None,
+                           max_token_distance=None, max_pairs_per_sentence=None)
+# Arreglos listos para LUKE (input_ids, attention_mask, entity_ids, entity_position_ids,
+# entity_attention_mask) de los pares únicos, en normalized_output_dir/model_arrays; los scripts de
+# modelado los leen con memory-map sin tokenizar. None no los escribe (requiere transformers)
+model_arrays_tokenizer = None
+# Longitud con padding y truncado de los arreglos, None usa el máximo del modelo (512 en luke-base)
+model_arrays_max_length = None
+# Cuenta los pares únicos que se pueden etiquetar con @TF$ / @Regulated$ (entrada de BERT, BioBERT, BioLinkBERT,
+# BioMegatron y BioRoBERTa); los scripts de BERT construyen las oraciones etiquetadas a partir de los spans al leer
+# los pares (marker_tagging.TaggedPairs), no se guarda una copia por par
+tagged_sentences = False
 # Local Alfredo
 #output_path_pkl = "/Users/avarela/lab_nlp/lab_gits/deep-learning-for-bionlp/Data-sets/STM_data_set_articles_for_LUKE.pkl"
 # Server pakal 
@@ -24,6 +67,13 @@ articles_path = "/export/storage/users/avarela/deep_learning_models/Data-sets/ST
 # Local carlos test
 #articles_path = "/home/cmendezc/Documents/ccg/gitlab-deep-learning-for-bionlp/Data-sets/pruebas_preprocessed"
 
+# Dumps XML de PubMed/PMC (.xml o .xml.gz). Si no es None, los artículos de la lista de PMIDs se
+# extraen como <PMID>.txt (un párrafo por línea) en articles_path antes de procesarlos; conviene
+# usar split_sentences = True con ellos. None procesa los archivos de texto que ya están en articles_path
+xml_dumps_path = None
+# Server pakal
+pmid_list_path = "/export/storage/users/avarela/deep_learning_models/Data-sets/264_salmo_pmids_for_bert_trn_reconstruction.tsv"
+
 
 # Local Alfredo 
 #tf_list_path = "/Users/avarela/lab_nlp/lab_gits/deep-learning-for-bionlp/Data-sets/STM_tfs.tsv"
@@ -38,6 +88,10 @@ tf_list_path = "/export/storage/users/avarela/deep_learning_models/Data-sets/STM
 #regulated_list_path = "/home/cmendezc/Documents/ccg/gitlab-deep-learning-for-bionlp/Data-sets/STM_regulated.tsv"
 # Server pakal 
 regulated_list_path = "/export/storage/users/avarela/deep_learning_models/Data-sets/STM_regulated.tsv"
+# Registro de organismos (TSV con columnas organism, tf_list, regulated_list; e.g. datasets/organisms.tsv):
+# las listas de todos se buscan en una sola pasada por los artículos y cada organismo tiene sus propias
+# salidas (el nombre se agrega a output_path, normalized_output_dir, etc.). None usa tf_list_path y regulated_list_path
+organism_registry_path = None
 
 # Local Alfredo 
 #output_path = "/Users/avarela/lab_nlp/lab_gits/deep-learning-for-bionlp/Data-sets/STM_data_set_articles_for_LUKE.tsv"
@@ -45,70 +99,130 @@ regulated_list_path = "/export/storage/users/avarela/deep_learning_models/Data-s
 #output_path = "/home/cmendezc/Documents/ccg/gitlab-deep-learning-for-bionlp/Data-sets/STM_data_set_articles_for_LUKE.tsv"
 # Server pakal 
 output_path = "/export/storage/users/avarela/deep_learning_models/Data-sets/STM_data_set_dl_articles_4600_preprocessed_for_luke.tsv"
+# Archivo columnar (Arrow) con los spans como enteros, se puede leer por columnas con memory-map
+output_path_arrow = "/export/storage/users/avarela/deep_learning_models/Data-sets/STM_data_set_dl_articles_4600_preprocessed_for_luke.arrow"
+# Tabla de oraciones sin duplicados y tabla de pares con spans enteros
+normalized_output_dir = "/export/storage/users/avarela/deep_learning_models/Data-sets/STM_data_set_dl_articles_4600_preprocessed_for_luke_normalized"
+# Archivos ya procesados: tamaño, mtime, hash y entidades encontradas
+manifest_path = output_path + ".manifest.jsonl"
+# Resumen de la corrida en JSON: tiempos por archivo, hits por entidad, pares por oración, bytes
+summary_path = output_path + ".summary.json"
+
+if __name__ == "__main__":
+    dictionary_rules = DictionaryRules(read_alias_table(alias_table_path) if alias_table_path else {}, ignore_case,
+                                       VARIANT_DELIMITERS if variant_delimiters else " ", legacy_spans)
+    if organism_registry_path is None:
+        df_tf_list = pd.read_csv(tf_list_path, sep="\t")
+        # print(df_tf_list.head())
+
+        df_regulated_list = pd.read_csv(regulated_list_path, sep="\t")
+        # print(df_tf_list.head())
+
+        tfs = list(df_tf_list['0'])
+        regulated = list(df_regulated_list['0'])
+        organisms = [Organism(None, tfs, regulated)]
+    else:
+        # Listas de cada organismo del registro, se buscan todas en la misma pasada
+        tfs, regulated = [], []
+        organisms = read_registry(organism_registry_path)
+        print("Organismos: {}".format(", ".join(organism.name for organism in organisms)))
+
+    # Artículos de los dumps XML, se leen en streaming y solo se guardan los de la lista de PMIDs
+    if xml_dumps_path is not None:
+        dumps = sorted(os.path.join(xml_dumps_path, f) for f in os.listdir(xml_dumps_path)
+                       if f.endswith((".xml", ".xml.gz")))
+        ingested, missing_pmids = ingest_dumps(dumps, read_pmid_list(pmid_list_path), articles_path)
+        print("Artículos de los dumps XML: {}, PMIDs no encontrados: {}".format(dict(ingested), len(missing_pmids)))
+
+    paths = [os.path.join(articles_path, f) for f in os.listdir(articles_path)]
+    summaries = {organism.name: RunSummary() for organism in organisms}
+
+    # Archivos nuevos, modificados o afectados por cambios en las listas, según el manifiesto de cada organismo
+    plans = {}
+    for organism in organisms:
+        organism_output = organism_path(output_path, organism.name)
+        header, records = read_manifest(organism_path(manifest_path, organism.name)) \
+            if incremental and os.path.exists(organism_output) else (None, [])
+        organism_reused, _ = plan_incremental_run(paths, header, records, organism.tfs, organism.regulated,
+                                                  pair_pruning, dictionary_rules, split_sentences)
+        plans[organism.name] = (records, organism_reused)
+    # Un archivo se reutiliza si no cambió para ningún organismo, los demás se buscan una vez para todos
+    reused = set.intersection(*(set(organism_reused) for _, organism_reused in plans.values()))
+    to_process = [path for path in paths if os.path.basename(path) not in reused]
+    previous_rows = {name: read_previous_rows(organism_path(output_path, name), records,
+                                              {f: organism_reused[f] for f in reused})
+                     for name, (records, organism_reused) in plans.items()}
+    print("Archivos reutilizados: {}, por procesar: {}".format(len(reused), len(to_process)))
+
+    # Solo se agregan al TSV las filas nuevas de cada archivo, un TSV y un manifiesto por organismo
+    with ExitStack() as stack:
+        writers = {}
+        for organism in organisms:
+            manifest = ManifestWriter(organism_path(manifest_path, organism.name), organism.tfs, organism.regulated,
+                                      pair_pruning, dictionary_rules, split_sentences)
+            writers[organism.name] = stack.enter_context(StreamingTSVWriter(
+                organism_path(output_path, organism.name), chunk_rows=chunk_rows, manifest=manifest))
+        # Para cada archivo en el directorio de entrada, en el mismo orden en serie o en paralelo
+        results = process_articles(to_process, tfs, regulated, n_workers=n_workers, verbose=verbose,
+                                   pruning=pair_pruning, rules=dictionary_rules, split_sentences=split_sentences,
+                                   organisms=organisms if organism_registry_path is not None else None)
+        for path in paths:
+            f = os.path.basename(path)
+            if f in reused:
+                for name, writer in writers.items():
+                    writer.write_rows(previous_rows[name].pop(f), plans[name][1][f])
+                    summaries[name].reused()
+                continue
+            result = next(results)
+            if organism_registry_path is None:
+                result = {None: result}
+            # El hash del archivo se calcula una vez, solo cambian las filas y entidades de cada organismo
+            record = article_record(path, result[organisms[0].name])
+            for name, writer in writers.items():
+                writer.write_rows(result[name].rows, dict(record, rows=len(result[name].rows),
+                                                          entities=result[name].entities))
+                summaries[name].update(result[name])
+
+    for organism in organisms:
+        summary = summaries[organism.name]
+        if organism.name is not None:
+            print("Organismo: {}".format(organism.name))
+        print("Archivos procesados: {}".format(len(summary.files)))
+        print(summary.report())
+        print("Líneas y pares por etapa: {}".format(dict(summary.stages)))
+
+    for organism in organisms:
+        summary = summaries[organism.name]
+        organism_output = organism_path(output_path, organism.name)
+        organism_normalized_dir = organism_path(normalized_output_dir, organism.name)
+
+        # All curated including multi regulator - mulit regulated using pandas and protocol 4 of serialization with pickle library
+        # Se construye a partir del TSV escrito, sin otra copia en memoria
+        tsv_to_pickle(organism_output, organism_path(output_path_pkl, organism.name))
+        tsv_to_arrow(organism_output, organism_path(output_path_arrow, organism.name))
+
+        # Cada oración se guarda una sola vez, los pares apuntan a ella
+        n_sentences, n_pairs = write_normalized(organism_output, organism_normalized_dir)
+        print("Oraciones: {}, pares: {}".format(n_sentences, n_pairs))
+
+        # Oraciones repetidas entre artículos (resúmenes, pies de figura, métodos): cada par único se evalúa
+        # una sola vez con LUKE y la predicción se copia a cada artículo (PMID) que lo contiene
+        dedup = write_deduplicated(organism_normalized_dir)
+        print("Pares únicos: {} de {} (deduplicación {:.2%}), oraciones únicas: {} de {}".format(
+            dedup["unique_pairs"], dedup["pairs"], dedup["dedup_ratio"], dedup["unique_sentences"], dedup["sentences"]))
+        summary.outputs["dedup"] = dedup
+
+        # Tokenización una sola vez, en el orden de UniquePairs
+        if model_arrays_tokenizer is not None:
+            unique_pairs = UniquePairs(organism_normalized_dir)
+            rows = [unique_pairs[i] for i in range(len(unique_pairs))]
+            summary.outputs["model_arrays"] = write_model_arrays(
+                os.path.join(organism_normalized_dir, MODEL_ARRAYS_DIR), [x.sentence for x in rows],
+                [x.entity_spans for x in rows], model_arrays_tokenizer, model_arrays_max_length)
+            print("Arreglos del modelo: {}".format(summary.outputs["model_arrays"]["shapes"]))
 
-df_tf_list = pd.read_csv(tf_list_path, sep="\t")
-# print(df_tf_list.head())
-
-df_regulated_list = pd.read_csv(regulated_list_path, sep="\t")
-# print(df_tf_list.head())
-
-df_for_luke = pd.DataFrame(columns=['sentence', 'entity_spans', 'regulator', 'regulated'])
-idx_sent = 0
-# Para cada archivo en el directoroi de entrada
-for f in os.listdir(articles_path):
-    print("Archivo: {}".format(f))
-    # Abre archivo
-    with open(os.path.join(articles_path, f), mode="r") as ifile:
-        # Para cada línea
-        for line in ifile:
-            spans_tf = []
-            spans_regulated = []
-            flag_tfs = False
-            flag_regulated = False
-            line = line.rstrip("\n")
-            # Para cada TF de la lista
-            for idx in df_tf_list.index:
-                tf = df_tf_list.iloc[idx]['0']
-                # Buscar TF separado por espacios
-                for match in re.finditer(r' (?P<tf>' + tf + ') ', line):
-                    flag_tfs = True
-                    # print(match.span())
-                    span = match.span()
-                    print("TF {} encontrado en {}".format(tf, span))
-                    print("Entidad: {}".format(line[span[0]:span[1]]))
-                    spans_tf.append(list(span))
-                    print(str(spans_tf))
-            # Si sí se encontraron TFs
-            if flag_tfs:
-                # Para cada regulado en la lista
-                for idx in df_regulated_list.index:
-                    regulated = df_regulated_list.iloc[idx]['0']
-                    # Buscar TF separado por espacios
-                    for match in re.finditer(r' (?P<regulated>' + regulated + ') ', line):
-                        flag_regulated = True
-                        # print(match.span())
-                        span = match.span()
-                        print("regulated {} encontrado en {}".format(regulated, span))
-                        print("Entidad: {}".format(line[span[0]:span[1]]))
-                        spans_regulated.append(list(span))
-                        print(str(spans_regulated))
-            if flag_tfs and flag_regulated:
-                entity_lists = [spans_tf, spans_regulated]
-                print("entity_lists: {}".format(entity_lists))
-                entity_combination = product(*entity_lists)
-                for elem in entity_combination:
-                    elem = [list(x)for x in elem]
-                    print("Combinations: {}".format(elem))
-                    df_for_luke.at[idx_sent, 'sentence'] = line
-                    df_for_luke.at[idx_sent, 'entity_spans'] = elem
-                    df_for_luke.at[idx_sent, 'regulator'] = line[elem[0][0]:elem[0][1]]
-                    df_for_luke.at[idx_sent, 'regulated'] = line[elem[1][0]:elem[1][1]]
-                    idx_sent += 1
-            print("**********")
-    df_for_luke.to_csv(output_path, index=False, sep="\t")
-    files += 1
-print("Archivos procesados: {}".format(files))
-
-# All curated including multi regulator - mulit regulated using pandas and protocol 4 of serialization with pickle library
-with open(output_path_pkl,"wb") as f:
-    pickle.dump(df_for_luke,f,protocol=4)
\ No newline at end of file
+        # Pares únicos que los scripts de BERT pueden etiquetar al leerlos
+        if tagged_sentences:
+            summary.outputs["taggable_pairs"] = count_taggable(UniquePairs(organism_normalized_dir))
+            print("Pares etiquetables: {}".format(summary.outputs["taggable_pairs"]))
+        summary.write(organism_path(summary_path, organism.name))
@@ -0,0 +1,147 @@
+import gzip
+import os
+import xml.etree.ElementTree as ET
+from collections import Counter
+
+import pandas as pd
+
+# Extension of the article files written for the preprocessing script, the name is the PMID
+ARTICLE_EXTENSION = ".txt"
+
+
+def read_pmid_list(pmid_list_path):
+    """
+    :param pmid_list_path: str, one PMID per line without header (264_salmo_pmids_for_bert_trn_reconstruction.tsv)
+    :return: set of str, PMIDs
+    """
+    df = pd.read_csv(pmid_list_path, sep="\t", header=None, dtype=str)
+    return set(df[0].str.strip())
+
+
+def local_name(tag):
+    """Tag without the XML namespace."""
+    return tag.rsplit("}", 1)[-1]
+
+
+def element_text(elem):
+    """Text of an element and its children, whitespace collapsed."""
+    return " ".join("".join(elem.itertext()).split())
+
+
+def pubmed_paragraphs(elem):
+    """
+    :param elem: Element, <PubmedArticle> of a PubMed/MEDLINE dump
+    :return: tuple, (PMID, list of paragraphs: title and abstract sections)
+    """
+    pmid = elem.findtext("MedlineCitation/PMID", default="").strip()
+    paragraphs = [element_text(x) for x in elem.iterfind("MedlineCitation/Article/ArticleTitle")]
+    paragraphs.extend(element_text(x) for x in elem.iterfind("MedlineCitation/Article/Abstract/AbstractText"))
+    return pmid, paragraphs
+
+
+def outer_paragraphs(elem):
+    """
+    :param elem: Element, part of a PMC article (abstract, body)
+    :return: generator of the <p> elements under elem that are not inside another <p>; the text of a <p> already has
+        the one of the <p> nested in its lists, boxed text, figures and table footnotes
+    """
+    for child in elem:
+        if child.tag == "p":
+            yield child
+        else:
+            yield from outer_paragraphs(child)
+
+
+def pmc_paragraphs(elem):
+    """
+    :param elem: Element, <article> of a PMC (JATS) dump
+    :return: tuple, (PMID, list of paragraphs: title, abstract and body paragraphs)
+    """
+    pmid = ""
+    for article_id in elem.iter("article-id"):
+        if article_id.get("pub-id-type") == "pmid":
+            pmid = (article_id.text or "").strip()
+            break
+    paragraphs = [element_text(x) for x in elem.iterfind("front/article-meta/title-group/article-title")]
+    for section in ("front/article-meta/abstract", "body"):
+        for part in elem.iterfind(section):
+            paragraphs.extend(element_text(x) for x in outer_paragraphs(part))
+    return pmid, paragraphs
+
+
+def iter_dump_articles(dump_path, pmids=None):
+    """
+    Stream the articles of a PubMed or PMC XML dump (.xml or .xml.gz).
+
+    The dump is parsed incrementally and every article element is cleared
+    once it is read, so only one article is in memory at a time.
+
+    :param dump_path: str, path of the dump
+    :param pmids: set of str, PMIDs to keep, all if None
+    :return: generator of (PMID, list of paragraphs)
+    """
+    opener = gzip.open if dump_path.endswith(".gz") else open
+    with opener(dump_path, "rb") as source:
+        root = None
+        for event, elem in ET.iterparse(source, events=("start", "end")):
+            if root is None:
+                root = elem
+            if event != "end":
+                continue
+            tag = local_name(elem.tag)
+            if tag == "PubmedArticle":
+                pmid, paragraphs = pubmed_paragraphs(elem)
+            elif tag == "article":
+                pmid, paragraphs = pmc_paragraphs(elem)
+            else:
+                continue
+            if pmids is None or pmid in pmids:
+                yield pmid, [x for x in paragraphs if x]
+            # Drop the article and the references the root keeps to it
+            elem.clear()
+            root.clear()
+
+
+def write_article(articles_path, pmid, paragraphs):
+    """
+    Write an article as ``<PMID>.txt`` with one paragraph per line.
+
+    The file is only rewritten when its text changed, so the manifest of
+    the preprocessing script still sees unchanged articles as reused.
+
+    :param articles_path: str, directory of the article files
+    :param pmid: str, PMID of the article
+    :param paragraphs: list of str, paragraphs of the article
+    :return: bool, True if the file was written
+    """
+    path = os.path.join(articles_path, pmid + ARTICLE_EXTENSION)
+    text = "".join(paragraph + "\n" for paragraph in paragraphs)
+    if os.path.exists(path):
+        with open(path) as f:
+            if f.read() == text:
+                return False
+    with open(path, "w") as f:
+        f.write(text)
+    return True
+
+
+def ingest_dumps(dump_paths, pmids, articles_path):
+    """
+    Write the articles of the PMID list found in the dumps as article files.
+
+    :param dump_paths: list, paths of the PubMed/PMC XML dumps
+    :param pmids: set of str, PMIDs to keep
+    :param articles_path: str, directory of the article files of the preprocessing script
+    :return: tuple, (Counter with written / unchanged / without_text articles, set of PMIDs not found)
+    """
+    os.makedirs(articles_path, exist_ok=True)
+    counters = Counter()
+    found = set()
+    for dump_path in dump_paths:
+        for pmid, paragraphs in iter_dump_articles(dump_path, pmids):
+            if not paragraphs:
+                counters["without_text"] += 1
+                continue
+            found.add(pmid)
+            counters["written" if write_article(articles_path, pmid, paragraphs) else "unchanged"] += 1
+    return counters, pmids - found
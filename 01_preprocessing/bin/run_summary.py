@@ -0,0 +1,83 @@
+import json
+import time
+from collections import Counter
+
+
+class RunSummary:
+    """
+    Instrumentation of a preprocessing run.
+
+    Sums the ArticleResult of every processed article: per-file timing, bytes
+    scanned, lines rejected by each prefilter stage, hits of every entity and
+    the distribution of candidate pairs per sentence. It replaces the per-match
+    print() calls, the summary is written as JSON at the end of the run.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.files = []
+        self.reused_files = 0
+        self.sentences = 0
+        self.bytes = 0
+        self.rows = 0
+        self.stages = Counter()
+        self.entity_hits = Counter()
+        self.pairs_per_sentence = Counter()
+        # Stats of the stages after the scan (e.g. deduplication)
+        self.outputs = {}
+
+    def update(self, result):
+        """
+        :param result: ArticleResult of a processed article
+        """
+        self.files.append({"file": result.file, "seconds": round(result.stats["seconds"], 6),
+                           "bytes": result.stats["bytes"], "sentences": result.n_sentences,
+                           "rows": len(result.rows)})
+        self.sentences += result.n_sentences
+        self.bytes += result.stats["bytes"]
+        self.rows += len(result.rows)
+        self.stages.update(result.counters)
+        self.entity_hits.update(result.stats["entity_hits"])
+        self.pairs_per_sentence.update(result.stats["pairs_per_sentence"])
+
+    def reused(self, n_files=1):
+        """Count articles whose rows were taken from the previous run."""
+        self.reused_files += n_files
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def report(self):
+        """
+        :return: str, one line with the throughput of the run
+        """
+        elapsed = self.elapsed()
+        return "{} archivos, {} oraciones, {} bytes en {:.2f} s ({:.2f} archivos/s, {:.2f} oraciones/s)".format(
+            len(self.files), self.sentences, self.bytes, elapsed,
+            len(self.files) / elapsed if elapsed else 0.0,
+            self.sentences / elapsed if elapsed else 0.0)
+
+    def to_dict(self):
+        elapsed = self.elapsed()
+        return {
+            "elapsed_seconds": round(elapsed, 6),
+            "processed_files": len(self.files),
+            "reused_files": self.reused_files,
+            "sentences": self.sentences,
+            "bytes_scanned": self.bytes,
+            "rows": self.rows,
+            "files_per_second": len(self.files) / elapsed if elapsed else 0.0,
+            "sentences_per_second": self.sentences / elapsed if elapsed else 0.0,
+            "stages": dict(self.stages),
+            "entity_hits": dict(self.entity_hits.most_common()),
+            "pairs_per_sentence": {str(k): v for k, v in sorted(self.pairs_per_sentence.items())},
+            "outputs": self.outputs,
+            "files": self.files,
+        }
+
+    def write(self, summary_path):
+        """
+        :param summary_path: str, path of the JSON summary
+        """
+        with open(summary_path, "w") as f:
+            json.dump(self.to_dict(), f, indent=1)
@@ -0,0 +1,185 @@
+import hashlib
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from normalized_dataset import PAIRS_FILE, SENTENCES_FILE, LukePairs
+
+UNIQUE_SENTENCES_FILE = "unique_sentences.tsv"
+UNIQUE_PAIRS_FILE = "unique_pairs.npy"
+PAIR_TO_UNIQUE_FILE = "pair_to_unique.npy"
+UNIQUE_SENTENCE_COLUMNS = ['unique_sentence_id', 'sentence']
+
+# Row of a unique (sentence, spans) pair, the attributes RelationExtractionDataset reads
+UniquePair = namedtuple("UniquePair", ["sentence", "entity_spans", "regulator", "regulated"])
+
+
+def normalize_sentence(sentence):
+    """
+    Collapse every run of whitespace to one space and strip the sentence.
+
+    :param sentence: str, sentence as it is in the article
+    :return: tuple, (normalized sentence, list with the position in it of every character of sentence)
+    """
+    normalized = []
+    offsets = []
+    previous_space = True
+    for char in sentence:
+        if char.isspace():
+            if not previous_space:
+                normalized.append(" ")
+            offsets.append(len(normalized) - 1 if normalized else 0)
+            previous_space = True
+        else:
+            offsets.append(len(normalized))
+            normalized.append(char)
+            previous_space = False
+    if normalized and normalized[-1] == " ":
+        normalized.pop()
+        # Trailing whitespace is mapped to the end of the normalized sentence
+        offsets = [min(offset, len(normalized)) for offset in offsets]
+    # Position of the end of the sentence, for spans that end there
+    offsets.append(len(normalized))
+    return "".join(normalized), offsets
+
+
+def normalized_span(sentence, offsets, start, end):
+    """
+    Position in the normalized sentence of a span of the sentence.
+
+    The whitespace at both ends of the span is left out: legacy spans
+    include the delimiters around the name (" ArcA "), whose remapped
+    positions could take the space after the name or end past the stripped
+    sentence.
+
+    :param sentence: str, sentence as it is in the article
+    :param offsets: list, positions given by normalize_sentence for sentence
+    :param start: int, start of the span in sentence
+    :param end: int, end of the span in sentence
+    :return: tuple, (start, end) in the normalized sentence
+    """
+    while start < end and sentence[start].isspace():
+        start += 1
+    while end > start and sentence[end - 1].isspace():
+        end -= 1
+    if start == end:
+        # Only whitespace, an empty span inside the stripped sentence
+        return offsets[start], offsets[start]
+    return offsets[start], offsets[end - 1] + 1
+
+
+def sentence_hash(normalized):
+    """
+    :param normalized: str, normalized sentence
+    :return: bytes, 16-byte BLAKE2b digest
+    """
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).digest()
+
+
+def write_deduplicated(dataset_dir, chunksize=100000):
+    """
+    Deduplicate the pairs of a normalized dataset across articles.
+
+    Sentences are keyed by the hash of their normalized text, and a pair by
+    its unique sentence and its spans in the normalized text, so a sentence
+    repeated in several articles (abstracts, figure legends, methods) gives
+    each of its pairs once. Written next to the normalized dataset:
+
+    - unique_sentences.tsv: unique_sentence_id, sentence (normalized).
+    - unique_pairs.npy: int32 array (n_unique_pairs, 5) with unique_sentence_id
+      and the spans in the normalized sentence (normalized_span, without the
+      whitespace at their ends).
+    - pair_to_unique.npy: int32 array (n_pairs,) with the unique pair of every
+      pair of pairs.npy, used to fan the predictions back out.
+
+    :param dataset_dir: str, directory written by write_normalized
+    :param chunksize: int, pairs read from pairs.npy at a time
+    :return: dict, pairs, unique_pairs, sentences, unique_sentences and dedup_ratio
+    """
+    sentences = pd.read_csv(os.path.join(dataset_dir, SENTENCES_FILE), sep="\t", dtype=str,
+                            keep_default_na=False, na_filter=False)['sentence'].tolist()
+    pairs = np.load(os.path.join(dataset_dir, PAIRS_FILE), mmap_mode="r")
+
+    unique_sentences = []
+    sentence_ids = {}
+    # unique_sentence_id and offsets of every sentence of the dataset
+    sentence_keys = []
+    for sentence in sentences:
+        normalized, offsets = normalize_sentence(sentence)
+        digest = sentence_hash(normalized)
+        if digest not in sentence_ids:
+            sentence_ids[digest] = len(unique_sentences)
+            unique_sentences.append(normalized)
+        sentence_keys.append((sentence_ids[digest], offsets))
+
+    unique_pairs = []
+    pair_ids = {}
+    pair_to_unique = np.empty(len(pairs), dtype=np.int32)
+    for start in range(0, len(pairs), chunksize):
+        for i, (sentence_id, start_tf, end_tf, start_regulated, end_regulated) in enumerate(
+                pairs[start:start + chunksize].tolist(), start):
+            unique_sentence_id, offsets = sentence_keys[sentence_id]
+            key = ((unique_sentence_id,)
+                   + normalized_span(sentences[sentence_id], offsets, start_tf, end_tf)
+                   + normalized_span(sentences[sentence_id], offsets, start_regulated, end_regulated))
+            if key not in pair_ids:
+                pair_ids[key] = len(unique_pairs)
+                unique_pairs.append(key)
+            pair_to_unique[i] = pair_ids[key]
+
+    pd.DataFrame({'unique_sentence_id': range(len(unique_sentences)), 'sentence': unique_sentences},
+                 columns=UNIQUE_SENTENCE_COLUMNS).to_csv(
+        os.path.join(dataset_dir, UNIQUE_SENTENCES_FILE), index=False, sep="\t")
+    np.save(os.path.join(dataset_dir, UNIQUE_PAIRS_FILE), np.asarray(unique_pairs, dtype=np.int32).reshape(-1, 5))
+    np.save(os.path.join(dataset_dir, PAIR_TO_UNIQUE_FILE), pair_to_unique)
+    return {"pairs": len(pairs), "unique_pairs": len(unique_pairs),
+            "sentences": len(sentences), "unique_sentences": len(unique_sentences),
+            "dedup_ratio": 1 - len(unique_pairs) / len(pairs) if len(pairs) else 0.0}
+
+
+class UniquePairs:
+    """
+    Unique (sentence, spans) pairs of a deduplicated dataset.
+
+    Works as LukePairs for RelationExtractionDataset (``data.iloc[idx]`` and
+    ``len(data)``), but every repeated pair is scored only once; the
+    predictions go back to every article with fan_out_predictions.
+    """
+
+    def __init__(self, dataset_dir):
+        """
+        :param dataset_dir: str, directory written by write_normalized and write_deduplicated
+        """
+        self.sentences = pd.read_csv(os.path.join(dataset_dir, UNIQUE_SENTENCES_FILE), sep="\t", dtype=str,
+                                     keep_default_na=False, na_filter=False)['sentence'].tolist()
+        self.pairs = np.load(os.path.join(dataset_dir, UNIQUE_PAIRS_FILE), mmap_mode="r")
+        self.n_all_pairs = len(np.load(os.path.join(dataset_dir, PAIR_TO_UNIQUE_FILE), mmap_mode="r"))
+        self.iloc = self
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def __repr__(self):
+        return "UniquePairs({} unique pairs of {} pairs)".format(len(self.pairs), self.n_all_pairs)
+
+    def __getitem__(self, idx):
+        sentence_id, start_tf, end_tf, start_regulated, end_regulated = self.pairs[idx].tolist()
+        sentence = self.sentences[sentence_id]
+        return UniquePair(sentence, [[start_tf, end_tf], [start_regulated, end_regulated]],
+                          sentence[start_tf:end_tf], sentence[start_regulated:end_regulated])
+
+
+def fan_out_predictions(dataset_dir, predictions):
+    """
+    Give the prediction of every unique pair to all the pairs it stands for.
+
+    :param dataset_dir: str, directory written by write_normalized and write_deduplicated
+    :param predictions: sequence, one prediction per unique pair, in the order of UniquePairs
+    :return: generator of (LukePair, prediction), one per pair of the dataset with its file, line and pmid
+    """
+    pair_to_unique = np.load(os.path.join(dataset_dir, PAIR_TO_UNIQUE_FILE), mmap_mode="r")
+    pairs = LukePairs(dataset_dir)
+    for idx in range(len(pairs)):
+        yield pairs[idx], predictions[int(pair_to_unique[idx])]
@@ -0,0 +1,74 @@
+import re
+
+# Words that end with a period without ending the sentence, lowercased and without the last period
+ABBREVIATIONS = frozenset([
+    "al", "approx", "ca", "cf", "co", "corp", "dr", "e.g", "eq", "eqs", "etc", "fig", "figs", "i.e", "i.p", "i.v",
+    "inc", "ltd", "mr", "ms", "no", "nos", "p", "pp", "prof", "ref", "refs", "resp", "ser", "sp", "spp",
+    "st", "str", "subsp", "suppl", "tab", "var", "viz", "vol", "vs",
+])
+# Candidate end of a sentence: terminal punctuation, optional closing quotes or brackets and whitespace
+BOUNDARY = re.compile(r"[.?!]+[\"')\]]*\s+(?=\S)")
+# Start of a sentence after an attached period: uppercase letter, digit or opening bracket
+SENTENCE_START = re.compile(r"[\"'(\[]?\s?[A-Z0-9]")
+# Initials, genus names and author initials: "E", "J.B", "C.G"
+INITIALS = re.compile(r"(?:[A-Z]\.)*[A-Z]")
+
+
+def is_abbreviation(text, period, abbreviations=ABBREVIATIONS):
+    """
+    :param text: str, paragraph
+    :param period: int, position of a period in text
+    :param abbreviations: frozenset, known abbreviations
+    :return: bool, True if the period belongs to an abbreviation
+    """
+    # Tokenized text separates the final period (" ."), abbreviations keep it attached ("Fig.")
+    if period == 0 or text[period - 1].isspace():
+        return False
+    word = text[:period].rsplit(None, 1)[-1].lstrip("\"'([")
+    # Initials and genus names: "E. coli", "S. Typhimurium", "Kenney , L.J. ( 1998 )"
+    if INITIALS.fullmatch(word):
+        return True
+    return word.lower() in abbreviations
+
+
+def split_sentences(text, abbreviations=ABBREVIATIONS):
+    """
+    Split a paragraph of article text into sentences.
+
+    A boundary is a terminal punctuation mark followed by whitespace and an
+    uppercase letter, a digit or an opening bracket, unless the period ends
+    a known abbreviation ("et al.", "Fig.", "e.g.") or an initial ("E. coli").
+    In tokenized text a detached mark (" . ") is always a boundary, so
+    sentences that start with a lowercase gene name ("iagB is ...") are kept.
+
+    :param text: str, paragraph, e.g. one line of a full-text article
+    :param abbreviations: frozenset, known abbreviations
+    :return: generator of str, sentences without surrounding whitespace
+    """
+    start = 0
+    for match in BOUNDARY.finditer(text):
+        detached = match.start() > 0 and text[match.start() - 1].isspace()
+        if not detached and not SENTENCE_START.match(text, match.end()):
+            continue
+        if text[match.start()] == "." and is_abbreviation(text, match.start(), abbreviations):
+            continue
+        sentence = text[start:match.end()].strip()
+        if sentence:
+            yield sentence
+        start = match.end()
+    sentence = text[start:].strip()
+    if sentence:
+        yield sentence
+
+
+def iter_sentences(lines, abbreviations=ABBREVIATIONS):
+    """
+    Stream the sentences of an article, one line (paragraph) in memory at a time.
+
+    :param lines: iterable of str, lines of the article file
+    :param abbreviations: frozenset, known abbreviations
+    :return: generator of str, sentences
+    """
+    for line in lines:
+        for sentence in split_sentences(line.rstrip("\n"), abbreviations):
+            yield sentence
@@ -0,0 +1,135 @@
+"""
+On-disk cache of the tokenized splits of the modelling scripts.
+
+Every trial of a grid sweep tokenized the same train/validation/test
+splits again, in every epoch. TokenizationCache encodes a split once with
+write_model_arrays (padding="max_length", int32 .npy files) in a directory
+named by the hash of everything the encoding depends on:
+
+- tokenizer name, tokenizer class, task, init kwargs (do_lower_case, special
+  tokens, ...) and vocabulary, and transformers version,
+- max_length,
+- the rows of the split (sentences, and entity spans for LUKE),
+- the name of the split.
+
+Later trials, epochs and runs memory-map the arrays with ModelArrays, and
+BatchCollator cuts the rows of every batch to its longest row when the
+batches are dynamically padded. Any change of the data or of the tokenizer
+gives another key, so an entry is never stale; old entries can be deleted
+by hand. Hits and misses are counted in stats.
+"""
+import hashlib
+import json
+import os
+import shutil
+
+from model_arrays import ModelArrays, padded_length, write_model_arrays
+
+# Key fields of an entry, next to model_arrays.json
+CACHE_KEY_FILE = "cache_key.json"
+
+
+def data_hash(sentences, entity_spans=None):
+    """
+    :param sentences: sequence of str, sentence of every row
+    :param entity_spans: sequence of [[start_tf, end_tf], [start_regulated, end_regulated]], None without spans
+    :return: str, sha256 of the rows in their order
+    """
+    digest = hashlib.sha256()
+    for idx, sentence in enumerate(sentences):
+        digest.update(sentence.encode("utf-8"))
+        if entity_spans is not None:
+            digest.update(json.dumps([[int(x) for x in span] for span in entity_spans[idx]]).encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def tokenizer_hash(tokenizer):
+    """
+    :param tokenizer: tokenizer of the model
+    :return: str, sha256 of the init kwargs without the local paths (name_or_path, vocabulary and tokenizer files) and
+        of the vocabulary, the same for the same tokenizer on every machine and Hugging Face cache directory
+    """
+    init_kwargs = {name: value for name, value in tokenizer.init_kwargs.items()
+                   if name != "name_or_path" and not name.endswith("_file")}
+    # Special tokens (AddedToken) are hashed by their text
+    digest = hashlib.sha256(json.dumps(init_kwargs, sort_keys=True, default=str).encode("utf-8"))
+    digest.update(json.dumps(sorted(tokenizer.get_vocab().items())).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class TokenizationCache:
+    """
+    Tokenized splits stored once per (tokenizer, max_length, data, split).
+
+    ``cache.encode("train", sentences, entity_spans)`` gives the ModelArrays
+    of the split, row i is row i of sentences, ``arrays[idx]`` gives its
+    encoding as the tokenizer did.
+    """
+
+    def __init__(self, cache_dir, tokenizer, tokenizer_name, max_length=None):
+        """
+        :param cache_dir: str, directory of the entries, created if missing
+        :param tokenizer: tokenizer of the model (AutoTokenizer, LukeTokenizer)
+        :param tokenizer_name: str, name or path the tokenizer was loaded from
+        :param max_length: int, padded and truncated length, None for the model maximum (ValueError if the
+            tokenizer has none)
+        """
+        self.cache_dir = cache_dir
+        self.tokenizer = tokenizer
+        self.tokenizer_name = tokenizer_name
+        self.max_length = padded_length(tokenizer, max_length)
+        self.tokenizer_hash = tokenizer_hash(tokenizer)
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Start the hit and miss counters again (e.g. for every trial of a sweep)."""
+        self.stats = {"hits": 0, "misses": 0}
+
+    def key(self, split, sentences, entity_spans=None):
+        """
+        :return: dict, fields the encoding of the split depends on
+        """
+        import transformers
+        return {"tokenizer": self.tokenizer_name, "tokenizer_class": type(self.tokenizer).__name__,
+                "task": getattr(self.tokenizer, "task", None),
+                "tokenizer_hash": self.tokenizer_hash,
+                "transformers": transformers.__version__, "max_length": self.max_length,
+                "data": data_hash(sentences, entity_spans), "rows": len(sentences), "split": split}
+
+    def encode(self, split, sentences, entity_spans=None):
+        """
+        :param split: str, name of the split ("train", "validation", "test")
+        :param sentences: sequence of str, sentence of every row
+        :param entity_spans: sequence of spans of every row for LUKE, None for the sequence classification models
+        :return: ModelArrays, memory-mapped encoding of the split
+        """
+        key = self.key(split, sentences, entity_spans)
+        digest = hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        entry_dir = os.path.join(self.cache_dir, "{}_{}".format(split, digest))
+        if os.path.exists(os.path.join(entry_dir, CACHE_KEY_FILE)):
+            self.stats["hits"] += 1
+            print("Tokenization cache hit: {} ({} rows) from {}".format(split, len(sentences), entry_dir))
+        else:
+            self.stats["misses"] += 1
+            print("Tokenization cache miss: {} ({} rows), writing {}".format(split, len(sentences), entry_dir))
+            # Written next to the entry and renamed, an interrupted run does not leave a partial entry
+            tmp_dir = entry_dir + ".tmp{}".format(os.getpid())
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            write_model_arrays(tmp_dir, list(sentences), entity_spans, self.tokenizer_name,
+                               max_length=self.max_length, tokenizer=self.tokenizer)
+            with open(os.path.join(tmp_dir, CACHE_KEY_FILE), "w") as f:
+                json.dump(key, f, indent=1)
+            try:
+                os.rename(tmp_dir, entry_dir)
+            except OSError:
+                # Written meanwhile by another run
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        return ModelArrays(entry_dir, self.tokenizer_name, self.max_length)
+
+    def report(self):
+        """
+        :return: dict, hits, misses and hit_ratio of the lookups of this cache
+        """
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return dict(self.stats, hit_ratio=self.stats["hits"] / lookups if lookups else 0.0)
@@ -55,7 +55,12 @@ torch.manual_seed(12222)
 #data = pd.read_pickle("../../01_preprocessing/results/ECO/curated_master_dataset/ECO_dataset_master_curated_whole_tagging_info_with_span_data_serialized_4_v2.pkl")
 
 # for ascend server running 
-data = pd.read_pickle("../data/ECO_dataset_master_curated_whole_tagging_info_with_span_data_serialized_4_v2.pkl")
+#data = pd.read_pickle("../data/ECO_dataset_master_curated_whole_tagging_info_with_span_data_serialized_4_v2.pkl")
+# Columnar copy of the pickle, only the columns used are read from the memory-mapped file
+import sys
+sys.path.append("../../01_preprocessing/bin")
+from columnar_dataset import StringArray, read_arrow
+data = read_arrow("../data/ECO_dataset_master_curated_whole_tagging_info_with_span_data_v2.arrow", columns=['sentence_tagged','NORMALIZED_EFFECT'])
 
 
 # In[24]:
@@ -115,40 +120,50 @@ print(label2id)
 # Specifing the model max length as it is not defined by the model 
 tokenizer = AutoTokenizer.from_pretrained("michiyasunaga/BioLinkBERT-base",model_max_length=512)
 
+#### Tokenization step
+# return_tensors: Specify the type of tensors we want to get back (PyTorch, TensorFlow, or plain NumPy)
+# padding: Tensors, the input of the model need to have a uniform shape but the sentences are not the same length with this we add a special token to the sentences that are shorter to ensure tensors are rectangular
+# padding true is to max sentence length because this tokenizer does not padd with a max length by itself
+# truncation: Sometimes a sequence may be too long for a model to handle. In this case we truncate the sentence to a shorter length. True, truncate a sequence to the maximum length accepted by the model 
+# The sentences of a batch are tokenized together, in one tokenizer call, by the collate_fn of the DataLoaders
+# padding=True pads every batch to its longest sentence instead of max_length, and LengthBucketSampler puts sentences
+# of similar length in the same batch, so the batches are much shorter than the 512 tokens of the model
+from batch_tokenization import BatchCollator, LengthBucketSampler
+collate = BatchCollator(tokenizer, padding=True)
+# Every split is tokenized once and stored in the tokenization cache, every trial and epoch (and the next runs)
+# read the memory-mapped arrays of the cache
+from tokenization_cache import TokenizationCache
+tokenization_cache = TokenizationCache("../data/tokenization_cache", tokenizer, "michiyasunaga/BioLinkBERT-base")
+
 
 class RelationExtractionDataset(Dataset):
     """Relation extraction dataset."""
 
-    def __init__(self, data):
+    def __init__(self, data, arrays=None):
         """
         Args:
             data : Pandas dataframe.
+            arrays : ModelArrays of the split (TokenizationCache), one row per row of data. None tokenizes every batch.
         """
-        self.data = data
+        # Columns pulled into plain arrays once, __getitem__ builds no pandas row and the DataLoader workers
+        # share them with the main process
+        self.sentences = StringArray(data.sentence)
+        self.labels = np.array([label2id[label] for label in data.label], dtype=np.int64)
+        self.arrays = arrays
 
     def __len__(self):
-        return len(self.data)
+        return len(self.labels)
 
     def __getitem__(self, idx):
-        item = self.data.iloc[idx]
+        if self.arrays is not None:
+            # Same encoding as the tokenizer call of the collate_fn, read from the memory-mapped arrays
+            return {"encoding": self.arrays[idx], "label": self.labels[idx]}
 
-        sentence = item.sentence
+        sentence = self.sentences[idx]
 #        entity_spans = [tuple(x) for x in item.entity_spans]
         
-#### Tokenization step
-# return_tensors: Specify the type of tensors we want to get back (PyTorch, TensorFlow, or plain NumPy)
-# padding: Tensors, the input of the model need to have a uniform shape but the sentences are not the same length with this we add a special token to the sentences that are shorter to ensure tensors are rectangular
-# padding true is to max sentence length because this tokenizer does not padd with a max length by itself
-# truncation: Sometimes a sequence may be too long for a model to handle. In this case we truncate the sentence to a shorter length. True, truncate a sequence to the maximum length accepted by the model 
-        encoding = tokenizer(sentence, padding="max_length", truncation=True, return_tensors="pt")
-
-        for k,v in encoding.items():
-          # squeeze removes dimensions with size 1 ensuring that tensors have the expected shape
-          encoding[k] = encoding[k].squeeze()
-
-        encoding["label"] = torch.tensor(label2id[item.label])
-
-        return encoding
+        # Tokenized by batch in the collate_fn of the DataLoaders (BatchCollator)
+        return {"sentence": sentence, "label": self.labels[idx]}
 
 
 # ### Splitting into random train and test subsets
@@ -165,9 +180,22 @@ print("length validation dataset: {}".format(len(val_df)))
 print("length test dataset: {}".format(len(test_df)))
 
 # define the dataset and tokenization
-train_dataset = RelationExtractionDataset(data=train_df)
-valid_dataset = RelationExtractionDataset(data=val_df)
-test_dataset = RelationExtractionDataset(data=test_df)
+train_dataset = RelationExtractionDataset(data=train_df, arrays=tokenization_cache.encode("train", train_df.sentence.tolist()))
+valid_dataset = RelationExtractionDataset(data=val_df, arrays=tokenization_cache.encode("validation", val_df.sentence.tolist()))
+test_dataset = RelationExtractionDataset(data=test_df, arrays=tokenization_cache.encode("test", test_df.sentence.tolist()))
+print("Tokenization cache: {}".format(tokenization_cache.report()))
+
+# Candidate pairs of new articles (normalized dataset written by preprocessing_articles_for_LUKE_from_entity_lists.py,
+# with spans only) for the predictions of the model: TaggedPairs builds the sentence with @TF$ / @Regulated$ of a pair
+# from its spans when the DataLoader reads it, no tagged copy of the sentences is stored. None skips it
+corpus_dir = None
+if corpus_dir is not None:
+    from marker_tagging import TaggedPairs
+    from sentence_dedup import UniquePairs
+    corpus_pairs = TaggedPairs(UniquePairs(corpus_dir))
+    corpus_dataloader = DataLoader(corpus_pairs, batch_size=32, shuffle=False,
+                                   collate_fn=lambda rows: collate([{"sentence": row.sentence} for row in rows]))
+    print("Corpus pairs: {}, example: {}".format(len(corpus_pairs), corpus_pairs.iloc[0].sentence))
 
 
 # In[31]:
@@ -181,9 +209,9 @@ print("test_dataset: {}".format(test_dataset))
 # In[32]:
 
 
-print("train_dataset.keys: {}".format(train_dataset[0].keys()))
-print("input_ids lenght: {}".format(len(train_dataset[0]["input_ids"])))
-print("train_dataset.values: {}".format(train_dataset[0].values()))
+print("train_dataset.keys: {}".format(collate([train_dataset[0]]).keys()))
+print("input_ids lenght: {}".format(len(collate([train_dataset[0]])["input_ids"][0])))
+print("train_dataset.values: {}".format(collate([train_dataset[0]]).values()))
 
 print("length train dataset : {}".format(len(train_dataset)))
 print("length validation dataset: {}".format(len(valid_dataset)))
@@ -409,15 +437,18 @@ class BIOLINKBERT_BASE(pl.LightningModule):
 
     def train_dataloader(self):
         # We will use 10,16,32 and 64
-        train_dataloader = DataLoader(train_dataset, batch_size=self.batch_size, shuffle=True)
+        train_dataloader = DataLoader(train_dataset, batch_sampler=LengthBucketSampler(train_df.sentence.str.len(), self.batch_size, shuffle=True),
+                                      collate_fn=collate)
         return train_dataloader
 
     def val_dataloader(self):
-        valid_dataloader = DataLoader(valid_dataset, batch_size=self.batch_size)
+        valid_dataloader = DataLoader(valid_dataset, batch_sampler=LengthBucketSampler(val_df.sentence.str.len(), self.batch_size, shuffle=False),
+                                      collate_fn=collate)
         return valid_dataloader
 
     def test_dataloader(self):
-        test_dataloader = DataLoader(test_dataset, batch_size=self.batch_size)
+        test_dataloader = DataLoader(test_dataset, batch_sampler=LengthBucketSampler(test_df.sentence.str.len(), self.batch_size, shuffle=False),
+                                     collate_fn=collate)
         return test_dataloader
 
 
@@ -471,6 +502,13 @@ sweep_id = wandb.sweep(sweep_config, project="deep_for_bio_nlp")
 
 def sweep_iteration():
     wandb.init()
+    collate.reset_stats()
+    # Every trial looks its splits up in the tokenization cache (written by the first lookup), the lookups of the
+    # trial are logged after training
+    tokenization_cache.reset_stats()
+    train_dataset.arrays = tokenization_cache.encode("train", train_df.sentence.tolist())
+    valid_dataset.arrays = tokenization_cache.encode("validation", val_df.sentence.tolist())
+    test_dataset.arrays = tokenization_cache.encode("test", test_df.sentence.tolist())
     wandb_logger = WandbLogger(name='biolinkbert_base_v2', project='deep_for_bio_nlp')
 # for early stopping, see https://pytorch-lightning.readthedocs.io/en/1.0.0/early_stopping.html?highlight=early%20stopping
     early_stop_callback = EarlyStopping(
@@ -492,6 +530,13 @@ def sweep_iteration():
     # original trainer params to run local 
     #trainer = Trainer(logger=wandb_logger, accelerator= 'cpu',devices= 1, callbacks=[EarlyStopping(monitor='validation_loss')])
     trainer.fit(model)
+    # Share of pad tokens of the batches of the trial, and the share with max_length padding
+    padding_report = collate.padding_report()
+    print("Padding: {}".format(padding_report))
+    wandb.log({"padding_ratio": padding_report["padding_ratio"],
+               "max_length_padding_ratio": padding_report["max_length_padding_ratio"]})
+    # Lookups of the splits of the trial in the tokenization cache
+    wandb.log({"tokenization_cache_" + key: value for key, value in tokenization_cache.report().items()})
 
 
 # In[50]:
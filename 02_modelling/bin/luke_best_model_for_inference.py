@@ -67,8 +67,24 @@ torch.manual_seed(12222)
 # Local Alfredo
 #data = pd.read_pickle("../../../Data-sets/STM_data_set_articles_for_LUKE.pkl")
 # server 
-data = pd.read_pickle("/export/storage/users/avarela/deep_learning_models/Data-sets/STM_data_set_dl_articles_4600_preprocessed_for_luke.pkl")
-data.columns
+#data = pd.read_pickle("/export/storage/users/avarela/deep_learning_models/Data-sets/STM_data_set_dl_articles_4600_preprocessed_for_luke.pkl")
+#data.columns
+
+# Normalized dataset: each sentence is stored once and the rows of the pairs are built when RelationExtractionDataset accesses them
+import sys
+sys.path.append("../../01_preprocessing/bin")
+from columnar_dataset import StringArray
+from sentence_dedup import UniquePairs, fan_out_predictions
+normalized_dataset_dir = "/export/storage/users/avarela/deep_learning_models/Data-sets/STM_data_set_dl_articles_4600_preprocessed_for_luke_normalized"
+# Every pair of the dataset
+#from normalized_dataset import LukePairs
+#data = LukePairs(normalized_dataset_dir)
+# Pairs repeated across articles are scored once, the predictions are fanned out to every article after inference
+data = UniquePairs(normalized_dataset_dir)
+# Inputs already tokenized by the preprocessing (model_arrays_tokenizer), in the order of UniquePairs; tokenized on access if missing
+import os
+from model_arrays import MODEL_ARRAYS_DIR, ModelArrays
+model_arrays_dir = os.path.join(normalized_dataset_dir, MODEL_ARRAYS_DIR)
 
 
 # In[12]:
@@ -110,11 +126,12 @@ print(type(df.iloc[:,2][2]))
 # In[14]:
 
 
-print(data.dtypes)
-print(type(data.iloc[:,0][0]))
-print(type(data.iloc[:,1][1]))
-print(data.iloc[:,1][1])
-print(type(data.iloc[:,2][2]))
+# Only for the pickled DataFrame
+#print(data.dtypes)
+#print(type(data.iloc[:,0][0]))
+#print(type(data.iloc[:,1][1]))
+#print(data.iloc[:,1][1])
+#print(type(data.iloc[:,2][2]))
 
 
 # In[8]:
@@ -126,7 +143,8 @@ df['entity_spans'] = df['entity_spans'].apply(lambda x: np.array(list(x)))
 # In[15]:
 
 
-data['entity_spans'] = data['entity_spans'].apply(lambda x: np.array(list(x)))
+# Only for the pickled DataFrame, LukePairs already gives the spans as lists of [start, end]
+#data['entity_spans'] = data['entity_spans'].apply(lambda x: np.array(list(x)))
 
 
 # In[28]:
@@ -153,9 +171,10 @@ print(type(df.iloc[:,2][2]))
 # In[18]:
 
 
-print(type(data.iloc[:,0][0]))
-print(type(data.iloc[:,1][1]))
-print(type(data.iloc[:,2][2]))
+# Only for the pickled DataFrame
+#print(type(data.iloc[:,0][0]))
+#print(type(data.iloc[:,1][1]))
+#print(type(data.iloc[:,2][2]))
 
 
 # ## Creating 2 dictionaries 
@@ -233,51 +252,66 @@ print(label2id)
 
 # We use this tokenizer from transformer library to turn the dataset into the inputs expected by the model 
 tokenizer = LukeTokenizer.from_pretrained("studio-ousia/luke-base", task="entity_pair_classification")
+arrays = ModelArrays(model_arrays_dir, "studio-ousia/luke-base") if os.path.exists(model_arrays_dir) else None
+
+#### Tokenization step
+# return_tensors: Specify the type of tensors we want to get back (PyTorch, TensorFlow, or plain NumPy)
+# padding: Tensors, the input of the model need to have a uniform shape but the sentences are not the same length with this we add a special token to the sentences that are shorter to ensure tensors are rectangular
+# truncation: Sometimes a sequence may be too long for a model to handle. In this case we truncate the sentence to a shorter length. True, truncate a sequence to the maximum length accepted by the model 
+# The sentences of a batch are tokenized together, in one tokenizer call with their entity_spans, by the
+# collate_fn of the DataLoader; the encoding goes in batch["tokenized_data"]
+# padding=True pads every batch to its longest sentence instead of max_length, and LengthBucketSampler puts sentences
+# of similar length in the same batch; the predictions are put back in the order of data with restore_order
+from batch_tokenization import BatchCollator, LengthBucketSampler, restore_order
+collate = BatchCollator(tokenizer, padding=True, encoding_key="tokenized_data")
 
 
 class RelationExtractionDataset(Dataset):
     """Relation extraction dataset."""
 
-    def __init__(self, data):
+    def __init__(self, data, arrays=None):
         """
         Args:
-            data : Pandas dataframe.
+            data : UniquePairs (or LukePairs) of the normalized dataset.
+            arrays : ModelArrays with one row per row of data. None tokenizes every batch.
         """
-        self.data = data
+        # The sentences once and the int32 pairs of the normalized dataset (sentence_id, start_tf, end_tf,
+        # start_regulated, end_regulated) as plain arrays, __getitem__ builds no row object and the DataLoader
+        # workers share them with the main process
+        self.sentences = StringArray(data.sentences)
+        self.sentence_ids = np.ascontiguousarray(data.pairs[:, 0])
+        self.entity_spans = np.ascontiguousarray(data.pairs[:, 1:]).reshape(-1, 2, 2)
+        self.arrays = arrays
 
     def __len__(self):
-        return len(self.data)
+        return len(self.sentence_ids)
 
     def __getitem__(self, idx):
-        item = self.data.iloc[idx]
-
-        sentence = item.sentence
+        sentence = self.sentences[self.sentence_ids[idx]]
         #sentence_tagged = item.sentence_tagged
-        regulator = item.regulator
-        regulated = item.regulated
-        entity_spans = [tuple(x) for x in item.entity_spans]
-        
-#### Tokenization step
-# return_tensors: Specify the type of tensors we want to get back (PyTorch, TensorFlow, or plain NumPy)
-# padding: Tensors, the input of the model need to have a uniform shape but the sentences are not the same length with this we add a special token to the sentences that are shorter to ensure tensors are rectangular
-# truncation: Sometimes a sequence may be too long for a model to handle. In this case we truncate the sentence to a shorter length. True, truncate a sequence to the maximum length accepted by the model 
-        encoding = tokenizer(sentence, entity_spans=entity_spans, padding="max_length", truncation=True, return_tensors="pt")
-
-        for k,v in encoding.items():
-          encoding[k] = encoding[k].squeeze()
+        entity_spans = self.entity_spans[idx]
+        (start_tf, end_tf), (start_regulated, end_regulated) = entity_spans
+        regulator = sentence[start_tf:end_tf]
+        regulated = sentence[start_regulated:end_regulated]
+
+        if self.arrays is not None:
+            # Same encoding as the tokenizer call of the collate_fn, read from the memory-mapped arrays
+            tokenized = {"encoding": self.arrays[idx]}
+        else:
+            # Tokenized by batch in the collate_fn of the DataLoader (BatchCollator), under "tokenized_data"
+            tokenized = {"entity_spans": entity_spans}
 
         #encoding["label"] = torch.tensor(label2id[item.label])
 
-       # Return both the tokenized data and the original sentence
-        return {
-            "tokenized_data": encoding,
+       # Return both the data to tokenize and the original sentence
+        return dict(tokenized, **{
             # store the original sentence
             "sentence": sentence,
             #"sentence_tagged":sentence_tagged,
             "regulator":regulator,
             "regulated":regulated
             
-        } 
+        })
 
 
 # ### Making the instances of the RelationExtractionDataset class
@@ -291,7 +325,7 @@ class RelationExtractionDataset(Dataset):
 print("length test dataset: {}".format(len(data)))
 
 # define the dataset
-infer_dataset = RelationExtractionDataset(data=data)
+infer_dataset = RelationExtractionDataset(data=data, arrays=arrays)
 
 
 # In[24]:
@@ -305,7 +339,10 @@ print("test_dataset: {}".format(infer_dataset) )
 
 # We will use 10,16,32 and 64
 # Shuffle = True indicates that the data will ensure a different order of samples in each epoch
-infer_dataloader = DataLoader(infer_dataset, batch_size=32)
+# Length of the sentence of every unique pair, the batches go from the shortest sentences to the longest
+sentence_lengths = np.array([len(sentence) for sentence in data.sentences])[np.asarray(data.pairs[:, 0])]
+infer_sampler = LengthBucketSampler(sentence_lengths, 32, shuffle=False)
+infer_dataloader = DataLoader(infer_dataset, batch_sampler=infer_sampler, collate_fn=collate)
 
 
 # In[26]:
@@ -580,6 +617,11 @@ model = LUKE.load_from_checkpoint(
 
 # Extract real sentences and predictions from the results without tagged sentences
 input_sentences,input_regulators,input_regulateds, predicted_labels = model.get_test_predictions(infer_dataloader)
+# Back to the order of the unique pairs of data, as fan_out_predictions expects them
+input_sentences, input_regulators, input_regulateds, predicted_labels = [
+    restore_order(values, infer_sampler.order)
+    for values in (input_sentences, input_regulators, input_regulateds, predicted_labels)]
+print("Padding: {}".format(collate.padding_report()))
 
 
 # In[33]:
@@ -632,10 +674,11 @@ with open("/export/storage/users/avarela/deep_learning_models/inference/luke_stm
 
     writer = csv.writer(output, delimiter='\t')
 #    writer.writerow(["sentence","sentence_tagged","regulator","regulated", "true_label", "predicted_label"])
-    writer.writerow(["regulator","regulated","predicted_label"])
+    writer.writerow(["pmid","file","line","regulator","regulated","predicted_label"])
 
-    for regulator, regulated, predicted_label in zip(input_regulators,input_regulateds, predicted_labels_words):
-        writer.writerow([regulator, regulated, predicted_label])
+    # The prediction of every unique pair goes to each article (PMID) that contains it
+    for pair, predicted_label in fan_out_predictions(normalized_dataset_dir, predicted_labels_words):
+        writer.writerow([pair.pmid, pair.file, pair.line, pair.regulator, pair.regulated, predicted_label])
 
 
 # In[38]:
@@ -646,10 +689,10 @@ with open("/export/storage/users/avarela/deep_learning_models/inference/luke_stm
 with open("/export/storage/users/avarela/deep_learning_models/inference/luke_stm_4600_predictions_with_sentence_all_dataset.tsv","w") as output:
     writer = csv.writer(output, delimiter='\t')
 #    writer.writerow(["sentence","sentence_tagged","regulator","regulated", "true_label", "predicted_label"])
-    writer.writerow(["sentence","regulator","regulated","predicted_label"])
+    writer.writerow(["pmid","file","line","sentence","regulator","regulated","predicted_label"])
 
-    for sentence, regulator, regulated, predicted_label in zip(input_sentences,input_regulators,input_regulateds, predicted_labels_words):
-        writer.writerow([sentence,regulator, regulated, predicted_label])
+    for pair, predicted_label in fan_out_predictions(normalized_dataset_dir, predicted_labels_words):
+        writer.writerow([pair.pmid, pair.file, pair.line, pair.sentence, pair.regulator, pair.regulated, predicted_label])
 
 
 # In[42]:
@@ -657,7 +700,7 @@ with open("/export/storage/users/avarela/deep_learning_models/inference/luke_stm
 # Local Alfredo 
 #all_predictions_tsv = pd.read_csv("../../02_modelling/inference/luke_stm_predictions_all_dataset.tsv", delimiter= "\t")
 # Sever pakal
-all_predictions_tsv = pd.read_csv("/export/storage/users/avarela/deep_learning_models/inference/luke_stm_4600_predictions_all_dataset.tsv")
+all_predictions_tsv = pd.read_csv("/export/storage/users/avarela/deep_learning_models/inference/luke_stm_4600_predictions_all_dataset.tsv", delimiter= "\t")
 filtered_df = all_predictions_tsv[all_predictions_tsv['predicted_label'] != 'no_relation']
 
 # Save the filtered data to a new tsv file
@@ -62,7 +62,12 @@ torch.manual_seed(12222)
 #data = pd.read_pickle("../../01_preprocessing/results/ECO/curated_master_dataset/ECO_dataset_master_curated_whole_tagging_info_with_span_data_serialized_4_v2.pkl")
 
 # for ascend server running 
-data = pd.read_pickle("../data/ECO_dataset_master_curated_whole_tagging_info_with_span_data_serialized_4_v2.pkl")
+#data = pd.read_pickle("../data/ECO_dataset_master_curated_whole_tagging_info_with_span_data_serialized_4_v2.pkl")
+# Columnar copy of the pickle, only the columns used are read from the memory-mapped file
+import sys
+sys.path.append("../../01_preprocessing/bin")
+from columnar_dataset import StringArray, read_arrow, stack_spans
+data = read_arrow("../data/ECO_dataset_master_curated_whole_tagging_info_with_span_data_v2.arrow", columns=['SENTENCE','span_regulator_regulated','NORMALIZED_EFFECT'])
 
 
 # In[4]:
@@ -208,38 +213,51 @@ print(label2id)
 # We use this tokenizer from transformer library to turn the dataset into the inputs expected by the model 
 tokenizer = LukeTokenizer.from_pretrained("studio-ousia/luke-base", task="entity_pair_classification")
 
+#### Tokenization step
+# return_tensors: Specify the type of tensors we want to get back (PyTorch, TensorFlow, or plain NumPy)
+# padding: Tensors, the input of the model need to have a uniform shape but the sentences are not the same length with this we add a special token to the sentences that are shorter to ensure tensors are rectangular
+# truncation: Sometimes a sequence may be too long for a model to handle. In this case we truncate the sentence to a shorter length. True, truncate a sequence to the maximum length accepted by the model 
+# The sentences of a batch are tokenized together, in one tokenizer call with their entity_spans, by the
+# collate_fn of the DataLoaders
+# padding=True pads every batch to its longest sentence instead of max_length, and LengthBucketSampler puts sentences
+# of similar length in the same batch, so the batches are much shorter than the 512 tokens of the model
+from batch_tokenization import BatchCollator, LengthBucketSampler
+collate = BatchCollator(tokenizer, padding=True)
+# Every split is tokenized once and stored in the tokenization cache, every trial and epoch (and the next runs)
+# read the memory-mapped arrays of the cache
+from tokenization_cache import TokenizationCache
+tokenization_cache = TokenizationCache("../data/tokenization_cache", tokenizer, "studio-ousia/luke-base")
+
 
 class RelationExtractionDataset(Dataset):
     """Relation extraction dataset."""
 
-    def __init__(self, data):
+    def __init__(self, data, arrays=None):
         """
         Args:
             data : Pandas dataframe.
+            arrays : ModelArrays of the split (TokenizationCache), one row per row of data. None tokenizes every batch.
         """
-        self.data = data
+        # Columns pulled into plain arrays once, __getitem__ builds no pandas row and the DataLoader workers
+        # share them with the main process
+        self.sentences = StringArray(data.sentence)
+        self.labels = np.array([label2id[label] for label in data.label], dtype=np.int64)
+        self.entity_spans = stack_spans(data.entity_spans)
+        self.arrays = arrays
 
     def __len__(self):
-        return len(self.data)
+        return len(self.labels)
 
     def __getitem__(self, idx):
-        item = self.data.iloc[idx]
+        if self.arrays is not None:
+            # Same encoding as the tokenizer call of the collate_fn, read from the memory-mapped arrays
+            return {"encoding": self.arrays[idx], "label": self.labels[idx]}
 
-        sentence = item.sentence
-        entity_spans = [tuple(x) for x in item.entity_spans]
+        sentence = self.sentences[idx]
+        entity_spans = self.entity_spans[idx]
         
-#### Tokenization step
-# return_tensors: Specify the type of tensors we want to get back (PyTorch, TensorFlow, or plain NumPy)
-# padding: Tensors, the input of the model need to have a uniform shape but the sentences are not the same length with this we add a special token to the sentences that are shorter to ensure tensors are rectangular
-# truncation: Sometimes a sequence may be too long for a model to handle. In this case we truncate the sentence to a shorter length. True, truncate a sequence to the maximum length accepted by the model 
-        encoding = tokenizer(sentence, entity_spans=entity_spans, padding="max_length", truncation=True, return_tensors="pt")
-
-        for k,v in encoding.items():
-          encoding[k] = encoding[k].squeeze()
-
-        encoding["label"] = torch.tensor(label2id[item.label])
-
-        return encoding
+        # Tokenized by batch in the collate_fn of the DataLoaders (BatchCollator)
+        return {"sentence": sentence, "entity_spans": entity_spans, "label": self.labels[idx]}
 
 
 # ### Spliting training and test groups (in this model we just train with 80% of data and evaluate with 20%) and making the instances of the RelationExtractionDataset class
@@ -254,8 +272,9 @@ print("length train dataset : {}".format(len(train_df)))
 print("length test dataset: {}".format(len(test_df)))
 
 # define the dataset
-train_dataset = RelationExtractionDataset(data=train_df)
-test_dataset = RelationExtractionDataset(data=test_df)
+train_dataset = RelationExtractionDataset(data=train_df, arrays=tokenization_cache.encode("train", train_df.sentence.tolist(), train_df.entity_spans.tolist()))
+test_dataset = RelationExtractionDataset(data=test_df, arrays=tokenization_cache.encode("test", test_df.sentence.tolist(), test_df.entity_spans.tolist()))
+print("Tokenization cache: {}".format(tokenization_cache.report()))
 
 
 # In[18]:
@@ -268,9 +287,9 @@ print("test_dataset: {}".format(test_dataset) )
 # In[19]:
 
 
-print("train_dataset.keys: {}".format(train_dataset[0].keys()))
-print("input_ids lenght: {}".format(len(train_dataset[0]["input_ids"])))
-print("train_dataset.values: {}".format(train_dataset[0].values()))
+print("train_dataset.keys: {}".format(collate([train_dataset[0]]).keys()))
+print("input_ids lenght: {}".format(len(collate([train_dataset[0]])["input_ids"][0])))
+print("train_dataset.values: {}".format(collate([train_dataset[0]]).values()))
 
 print("length train dataset : {}".format(len(train_dataset)))
 print("length test dataset: {}".format(len(test_dataset)))
@@ -363,8 +382,11 @@ print('input_id of "this": {}'.format(vocab["this"]))
 
 # We will use 10,16,32 and 64
 # Shuffle = True indicates that the data will ensure a different order of samples in each epoch
-train_dataloader = DataLoader(train_dataset, batch_size=32, shuffle=True)
-test_dataloader = DataLoader(test_dataset, batch_size=32)
+# (new batches of sentences of similar length in a different order)
+train_dataloader = DataLoader(train_dataset, batch_sampler=LengthBucketSampler(train_df.sentence.str.len(), 32, shuffle=True),
+                              collate_fn=collate)
+test_dataloader = DataLoader(test_dataset, batch_sampler=LengthBucketSampler(test_df.sentence.str.len(), 32, shuffle=False),
+                             collate_fn=collate)
 
 
 # In[23]:
@@ -601,6 +623,8 @@ trainer = Trainer(logger=wandb_logger, accelerator= 'auto',devices= 'auto', max_
 # original trainer params to run local 
 #trainer = Trainer(logger=wandb_logger, accelerator= 'cpu',devices= 1, callbacks=[EarlyStopping(monitor='validation_loss')])
 
+# Padding counters of the training and test batches only
+collate.reset_stats()
 trainer.fit(model)
 
 
@@ -609,3 +633,6 @@ trainer.fit(model)
 
 trainer.test()
 
+# Share of pad tokens of the batches, and the share with max_length padding
+print("Padding: {}".format(collate.padding_report()))
+